@@ -1,21 +1,76 @@
-import os
-import logging
-from dotenv import load_dotenv
-from supabase import create_client, Client
-
-load_dotenv()
-logger = logging.getLogger("Database")
-
-# МЫ НЕ ПИШЕМ КЛЮЧИ СЮДА ЯВНО! МЫ ИСПОЛЬЗУЕМ os.getenv
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = None
-
-if SUPABASE_URL and SUPABASE_KEY:
-    try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        logger.info("✅ Supabase подключена")
-    except Exception as e:
-        logger.error(f"❌ Ошибка подключения Supabase: {e}")
-else:
-    logger.warning("⚠️ SUPABASE_URL или SUPABASE_KEY не найдены в .env")
\ No newline at end of file
+import os
+import asyncio
+import logging
+from typing import Optional
+import httpx
+from dotenv import load_dotenv
+from supabase import create_client, Client, ClientOptions, acreate_client, AsyncClient, AsyncClientOptions
+from app.services.metrics import TimedAsyncTransport, TimedTransport
+
+load_dotenv()
+logger = logging.getLogger("Database")
+
+# МЫ НЕ ПИШЕМ КЛЮЧИ СЮДА ЯВНО! МЫ ИСПОЛЬЗУЕМ os.getenv
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+DB_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+DB_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+supabase: Client = None
+
+if SUPABASE_URL and SUPABASE_KEY:
+    try:
+        # Через свой httpx-клиент — чтобы замерять каждый запрос к PostgREST (см. metrics)
+        _sync_http = httpx.Client(
+            transport=TimedTransport(httpx.HTTPTransport(), "supabase"),
+            timeout=DB_TIMEOUT,
+            follow_redirects=True,
+        )
+        supabase = create_client(SUPABASE_URL, SUPABASE_KEY, ClientOptions(httpx_client=_sync_http))
+        logger.info("✅ Supabase подключена")
+    except Exception as e:
+        logger.error("❌ Ошибка подключения Supabase: %s", e)
+else:
+    logger.warning("⚠️ SUPABASE_URL или SUPABASE_KEY не найдены в .env")
+
+# --- Асинхронный клиент (для горячих эндпоинтов, например /api/scan) ---
+# Один общий httpx-клиент с пулом keep-alive соединений на весь процесс
+
+_async_client: Optional[AsyncClient] = None
+_async_http: Optional[httpx.AsyncClient] = None
+_async_lock: Optional[asyncio.Lock] = None
+
+
+async def get_async_supabase() -> Optional[AsyncClient]:
+    """Ленивая инициализация асинхронного клиента Supabase (None, если нет ключей)"""
+    global _async_client, _async_http, _async_lock
+    if _async_client is not None or not (SUPABASE_URL and SUPABASE_KEY):
+        return _async_client
+
+    if _async_lock is None:
+        _async_lock = asyncio.Lock()
+    async with _async_lock:
+        if _async_client is None:
+            transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=DB_POOL_SIZE,
+                    max_keepalive_connections=DB_POOL_SIZE,
+                ),
+            )
+            _async_http = httpx.AsyncClient(
+                transport=TimedAsyncTransport(transport, "supabase"),
+                timeout=DB_TIMEOUT,
+                follow_redirects=True,
+            )
+            _async_client = await acreate_client(
+                SUPABASE_URL, SUPABASE_KEY, AsyncClientOptions(httpx_client=_async_http)
+            )
+            logger.info("✅ Async Supabase подключена (пул %s)", DB_POOL_SIZE)
+    return _async_client
+
+
+async def close_async_supabase() -> None:
+    global _async_client, _async_http
+    if _async_http is not None:
+        await _async_http.aclose()
+    _async_client = None
+    _async_http = None
@@ -0,0 +1,137 @@
+# Настройка логов приложения.
+#
+# Потоки запросов не пишут в stdout сами: запись кладётся в очередь
+# (QueueHandler), а печатает её отдельный поток (QueueListener).
+# Формат — JSON-строка на запись (LOG_FORMAT=text — обычный текст для
+# локальной отладки), в каждой записи есть id запроса.
+# Повторяющиеся записи, помеченные extra={"sample": True}, прореживаются.
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Прореживание: за окно LOG_SAMPLE_WINDOW секунд первые LOG_SAMPLE_BURST записей
+# одного шаблона проходят все, дальше — каждая LOG_SAMPLE_EVERY-я
+LOG_SAMPLE_WINDOW = float(os.getenv("LOG_SAMPLE_WINDOW", "60"))
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "5"))
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+
+# id текущего HTTP-запроса (ставится middleware в main.py); "-" — фоновые потоки
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Стандартные поля LogRecord — всё остальное считаем полями из extra
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Добавляет request_id; работает в потоке запроса, пока контекст ещё доступен"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Прореживает записи с extra={"sample": True}; WARNING и выше проходят всегда"""
+
+    def __init__(self, window: float = LOG_SAMPLE_WINDOW, burst: int = LOG_SAMPLE_BURST,
+                 every: int = LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.every = max(every, 1)
+        # (логгер, шаблон сообщения) -> [начало окна, записей в окне]
+        self._counts: Dict[tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sample", False) or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry is None or now - entry[0] > self.window:
+                entry = self._counts[key] = [now, 0]
+            entry[1] += 1
+            seen = int(entry[1])
+        if seen <= self.burst:
+            return True
+        if (seen - self.burst) % self.every == 0:
+            record.sampled = self.every  # одна запись за every похожих
+            return True
+        return False
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и трейсбек собираем здесь, в очередь уходит готовая копия
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and key not in data and key != "sample":
+                data[key] = value
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging() -> None:
+    """Корневой логгер -> очередь -> поток, пишущий в stdout. Повторный вызов ничего не делает"""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(SamplingFilter())
+
+    stream = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "text":
+        stream.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        ))
+    else:
+        stream.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    # httpx пишет INFO на каждый запрос к Supabase — это тысячи строк за смену
+    for noisy in ("httpx", "httpcore", "googleapiclient.discovery_cache"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    # Допечатать очередь при выходе процесса
+    atexit.register(_listener.stop)
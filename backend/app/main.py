@@ -1,122 +1,207 @@
-import logging
-import os
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles # <--- 1. НОВЫЙ ИМПОРТ
-from fastapi.responses import FileResponse  # <--- 2. НОВЫЙ ИМПОРТ
-
-from app.services.google_sheets import GoogleSheetsService
-from app.database import supabase
-from app.routers import printing as print_router
-from app.routers import scan as scan_router
-
-# --- НАСТРОЙКИ ---
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("SauceControl")
-
-sheets_service = GoogleSheetsService()
-
-app = FastAPI(title="Sauce Control v2")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Подключаем API
-app.include_router(print_router.router)
-app.include_router(scan_router.router)
-
-# --- API Endpoints ---
-@app.get("/api/ping")
-def ping():
-    return {"status": "ok"}
-
-@app.get("/api/users")
-def get_users_api():
-    users = sheets_service.get_users()
-    try:
-        count = len(users)
-    except TypeError:
-        count = -1
-
-    logger.info("GET /api/users -> %s пользователей: %s", count, [u.name for u in users])
-    return users
-
-@app.get("/api/machines")
-def get_machines():
-    return sheets_service.get_machines()
-
-@app.get("/api/brands")
-def get_brands_api():
-    brands = sheets_service.get_brands()
-    try:
-        count = len(brands)
-    except TypeError:
-        count = -1
-
-    logger.info("GET /api/brands -> %s брендов", count)
-
-    if count > 0:
-        example = brands[0]
-        try:
-            if hasattr(example, "dict"):
-                logger.info("Пример бренда: %s", example.dict())
-            elif hasattr(example, "model_dump"):
-                logger.info("Пример бренда: %s", example.model_dump())
-            else:
-                logger.info("Пример бренда (raw): %s", example)
-        except Exception as e:
-            logger.warning("Не удалось залогировать пример бренда: %s", e)
-
-    return brands
-
-@app.post("/api/auth/login")
-def login(req: dict):
-    users = sheets_service.get_users()
-    user_id = req.get("user_id")
-    pin_code = req.get("pin_code")
-
-    logger.info("LOGIN attempt: user_id=%s, pin_code=%s", user_id, pin_code)
-    logger.info("LOGIN users in memory: %s", [u.name for u in users])
-
-    user = next((u for u in users if u.name == user_id), None)
-
-    if user:
-        logger.info("LOGIN found user: %s (stored pin=%s)", user.name, user.pin_code)
-    else:
-        logger.info("LOGIN user not found: %s", user_id)
-
-    if user and str(user.pin_code).strip() == str(pin_code).strip():
-        logger.info("LOGIN success for %s", user_id)
-        return {"success": True, "user": user}
-
-    logger.info("LOGIN failed for %s (bad pin?)", user_id)
-    return {"success": False, "message": "Неверный ПИН"}
-
-
-# --- 3. РАЗДАЧА ФРОНТЕНДА (В САМОМ НИЗУ) ---
-
-# Указываем путь к папке static (она должна лежать рядом с папкой app)
-static_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
-
-if os.path.exists(static_path):
-    # Подключаем статику (картинки, скрипты)
-    app.mount("/assets", StaticFiles(directory=os.path.join(static_path, "assets")), name="assets")
-
-    # Любой другой путь возвращает index.html (для работы Vue Router)
-    @app.get("/{full_path:path}")
-    async def serve_vue_app(full_path: str):
-        return FileResponse(os.path.join(static_path, "index.html"))
-else:
-    print("⚠️ Папка static не найдена. Запустите 'npm run build' и скопируйте dist в backend/static")
-
-if __name__ == "__main__":
-    import uvicorn
-
-    uvicorn.run(app, host="0.0.0.0", port=8000)
-
-
+import logging
+import os
+import time
+import uuid
+from typing import Optional
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles # <--- 1. НОВЫЙ ИМПОРТ
+from fastapi.responses import FileResponse  # <--- 2. НОВЫЙ ИМПОРТ
+from fastapi.responses import PlainTextResponse
+
+# Логи настраиваем до импорта сервисов: они пишут в лог уже при загрузке
+from app.logging_setup import setup_logging, request_id_var
+setup_logging()
+
+from app.services.google_sheets import GoogleSheetsService
+from app.services.brand_search import BrandSearchIndex
+from app.database import supabase, close_async_supabase
+from app.services import pdf as pdf_service
+from app.services.print_jobs import print_jobs
+from app.services.outbox import outbox
+from app.services.batch_cache import batch_cache
+from app.services import metrics
+from app.routers import printing as print_router
+from app.routers import scan as scan_router
+
+# --- НАСТРОЙКИ ---
+logger = logging.getLogger("SauceControl")
+
+sheets_service = GoogleSheetsService()
+brand_index = BrandSearchIndex()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Фоновая отправка уведомлений и строк отчёта (в т.ч. оставшихся с прошлого запуска)
+    outbox.start()
+    yield
+    # Закрываем общий пул соединений к Supabase и процессы рендера PDF
+    await close_async_supabase()
+    print_jobs.shutdown()
+    pdf_service.shutdown_pool()
+    outbox.shutdown()
+
+
+app = FastAPI(title="Sauce Control v2", lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+@app.middleware("http")
+async def measure_latency(request: Request, call_next):
+    """Время ответа по шаблону пути (/api/print/{batch_id}.pdf), а не по конкретному URL"""
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        metrics.HTTP_ERRORS.inc(request.method, _route_label(request))
+        raise
+    metrics.HTTP_LATENCY.observe(
+        time.perf_counter() - started, request.method, _route_label(request), response.status_code
+    )
+    return response
+
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """id запроса для логов: из заголовка X-Request-ID (если прислали) или новый"""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:12]
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+def _route_label(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _runtime_metrics():
+    yield "# HELP batch_cache_entries Строк партий в кэше"
+    yield "# TYPE batch_cache_entries gauge"
+    yield f"batch_cache_entries {batch_cache.stats()['size']}"
+    yield "# HELP outbox_jobs Задания outbox по состоянию"
+    yield "# TYPE outbox_jobs gauge"
+    for state, count in outbox.stats().items():
+        yield f'outbox_jobs{{state="{state}"}} {count}'
+    yield "# HELP print_jobs_active Заданий печати в очереди и в работе"
+    yield "# TYPE print_jobs_active gauge"
+    yield f"print_jobs_active {print_jobs.active}"
+
+
+metrics.register_collector(_runtime_metrics)
+
+# Подключаем API
+app.include_router(print_router.router)
+app.include_router(scan_router.router)
+
+# --- API Endpoints ---
+@app.get("/api/ping")
+def ping():
+    return {"status": "ok"}
+
+@app.get("/api/users")
+def get_users_api():
+    users = sheets_service.get_users()
+    try:
+        count = len(users)
+    except TypeError:
+        count = -1
+
+    logger.info("GET /api/users -> %s пользователей", count, extra={"sample": True})
+    return users
+
+@app.get("/api/machines")
+def get_machines():
+    return sheets_service.get_machines()
+
+@app.get("/api/brands")
+def get_brands_api():
+    brands = sheets_service.get_brands()
+    try:
+        count = len(brands)
+    except TypeError:
+        count = -1
+
+    logger.info("GET /api/brands -> %s брендов", count, extra={"sample": True})
+    return brands
+
+@app.get("/api/brands/search")
+def search_brands_api(q: str = "", limit: int = 20):
+    """Поиск бренда по названию и алиасам (регистр, ё/е, латиница/кириллица)"""
+    brand_index.sync(sheets_service.get_brands())
+    return brand_index.search(q, limit=max(1, min(limit, 100)))
+
+@app.post("/api/cache/invalidate")
+def invalidate_cache(batch_id: Optional[str] = None):
+    """Сброс кэшей после правки данных, чтобы не ждать TTL.
+
+    С batch_id — только строка этой партии (после её правки в БД),
+    без него — справочники из таблицы и все партии.
+    """
+    if batch_id:
+        batch_cache.invalidate(batch_id)
+        logger.info("Кэш партии %s сброшен", batch_id)
+        return {"success": True}
+    sheets_service.invalidate()
+    batch_cache.invalidate()
+    logger.info("Кэш справочников и партий сброшен")
+    return {"success": True}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    """Попадания и промахи кэша партий"""
+    return {"batches": batch_cache.stats()}
+
+@app.post("/api/auth/login")
+def login(req: dict):
+    user_id = req.get("user_id")
+    user = sheets_service.check_login(user_id, req.get("pin_code"))
+
+    if user:
+        logger.info("LOGIN success for %s", user.name)
+        return {"success": True, "user": user}
+
+    logger.info("LOGIN failed for %s", user_id)
+    return {"success": False, "message": "Неверный ПИН"}
+
+
+# --- 3. РАЗДАЧА ФРОНТЕНДА (В САМОМ НИЗУ) ---
+
+# Указываем путь к папке static (она должна лежать рядом с папкой app)
+static_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
+
+if os.path.exists(static_path):
+    # Подключаем статику (картинки, скрипты)
+    app.mount("/assets", StaticFiles(directory=os.path.join(static_path, "assets")), name="assets")
+
+    # Любой другой путь возвращает index.html (для работы Vue Router)
+    @app.get("/{full_path:path}")
+    async def serve_vue_app(full_path: str):
+        return FileResponse(os.path.join(static_path, "index.html"))
+else:
+    logger.warning("⚠️ Папка static не найдена. Запустите 'npm run build' и скопируйте dist в backend/static")
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+
@@ -1,53 +1,67 @@
-# backend/app/models.py
-from typing import Optional, List
-from pydantic import BaseModel
-
-# --- Модели для данных из Google Sheets и API ---
-
-class User(BaseModel):
-    name: str
-    pin_code: str
-    is_active: bool = True
-
-
-class Machine(BaseModel):
-    id: str
-    name: str
-    type_allowed: str = ""
-    category_allowed: str = ""
-    is_active: bool = True
-
-
-class Brand(BaseModel):
-    # Описание продукта из таблицы brands
-    brand_name: str
-    type: str
-    category: str
-    recipe: str
-    items_per_box: int
-    aliases: str = ""          # Алиасы для поиска
-    # Поля ниже используются только в части экранов и могут быть пустыми
-    count: int = 0
-    batch_number: Optional[str] = ""
-
-
-class PrintRequest(BaseModel):
-    # Запрос на создание партии и PDF
-    brand_name: str
-    type: str
-    category: str
-    recipe: str
-    items_per_box: int
-    count: int
-    batch_number: Optional[str] = ""
-
-
-class ScanRequest(BaseModel):
-    box_id: str
-    mode: str = "production"  # production / inventory / revision
-
-    # Поля для режима фасовки
-    user_name: Optional[str] = None
-    machine_id: Optional[str] = None
-    scanned_at_local: Optional[str] = None  # Время на устройстве (если был офлайн)
-    coworkers: Optional[List[str]] = None   # Дополнительные операторы (по именам)
+# backend/app/models.py
+from typing import Optional, List
+from pydantic import BaseModel
+
+# --- Модели для данных из Google Sheets и API ---
+
+class User(BaseModel):
+    name: str
+    pin_code: str
+    is_active: bool = True
+
+
+class Machine(BaseModel):
+    id: str
+    name: str
+    type_allowed: str = ""
+    category_allowed: str = ""
+    is_active: bool = True
+
+
+class Brand(BaseModel):
+    # Описание продукта из таблицы brands
+    brand_name: str
+    type: str
+    category: str
+    recipe: str
+    items_per_box: int
+    aliases: str = ""          # Алиасы для поиска
+    # Поля ниже используются только в части экранов и могут быть пустыми
+    count: int = 0
+    batch_number: Optional[str] = ""
+
+
+class PrintRequest(BaseModel):
+    # Запрос на создание партии и PDF
+    brand_name: str
+    type: str
+    category: str
+    recipe: str
+    items_per_box: int
+    count: int
+    batch_number: Optional[str] = ""
+    # True — сразу вернуть id задания печати, PDF забирать по /api/print/jobs/{id}
+    background: bool = False
+
+
+class ScanRequest(BaseModel):
+    box_id: str
+    mode: str = "production"  # production / inventory / revision
+
+    # Поля для режима фасовки
+    user_name: Optional[str] = None
+    machine_id: Optional[str] = None
+    scanned_at_local: Optional[str] = None  # Время на устройстве (если был офлайн)
+    coworkers: Optional[List[str]] = None   # Дополнительные операторы (по именам)
+
+    # Для режима инвентаризации: id сессии из /api/inventory/start
+    session_id: Optional[str] = None
+
+
+class InventoryStartRequest(BaseModel):
+    user_name: Optional[str] = None
+
+
+class ScanBatchRequest(BaseModel):
+    # Очередь сканов, накопленная планшетом без сети (в порядке сканирования)
+    scans: List[ScanRequest]
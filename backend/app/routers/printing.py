@@ -1,77 +1,247 @@
-import uuid
-from datetime import datetime
-import pytz
-from fastapi import APIRouter, HTTPException
-from app.models import PrintRequest
-from app.services.pdf import generate_pdf_base64
-from app.database import supabase # Подключение к БД
-
-router = APIRouter()
-TZ = pytz.timezone("Asia/Yekaterinburg")
-
-@router.post("/api/print")
-def api_print(req: PrintRequest):
-    """Создает партию и PDF (для планшета)"""
-    try:
-        now = datetime.now(TZ)
-        # Формируем полное название, как в старой программе
-        product_full = f"{req.type} {req.category} {req.recipe} {req.brand_name} ({req.items_per_box} шт/кор.)"
-
-        batch_id = None
-        boxes = []
-
-        # 1. Запись партии в БД
-        if supabase:
-            # ВАЖНО: Добавляем заглушки для полей user_name и machine_name, 
-            # чтобы Supabase не ругалась на ошибку 400
-            batch_data = {
-                "product_info": product_full,
-                "planned_quantity": req.count,
-                "batch_number": req.batch_number or "",
-                "user_name": "Печать на планшете", # <-- Заглушка
-                "machine_name": "Не назначена"     # <-- Заглушка
-            }
-            
-            batch_res = supabase.table("batches").insert(batch_data).execute()
-            
-            # Проверяем, вернулись ли данные
-            if batch_res.data and len(batch_res.data) > 0:
-                batch_id = batch_res.data[0]["id"]
-            else:
-                raise Exception("Не удалось получить ID новой партии из БД")
-
-            # 2. Генерация ID коробок
-            for _ in range(req.count):
-                nid = str(uuid.uuid4())
-                boxes.append({"id": nid, "batch_id": batch_id, "status": "CREATED"})
-            
-            # Вставляем коробки
-            supabase.table("boxes").insert(boxes).execute()
-        
-        else:
-            # Режим без БД (тестовый)
-            for _ in range(req.count):
-                boxes.append({"id": str(uuid.uuid4())})
-
-        # 3. Генерация PDF
-        label_data = {
-            "type": req.type,
-            "category": req.category,
-            "recipe": req.recipe,
-            "brand": req.brand_name,
-            "items_per_box": req.items_per_box,
-            "date": now.strftime("%d.%m.%y"),
-            "time": now.strftime("%H:%M"),
-        }
-
-        pdf_b64 = generate_pdf_base64(boxes, label_data)
-
-        return {
-            "success": True,
-            "batch_id": batch_id,
-            "pdf_base64": pdf_b64,
-            "filename": f"Batch_{batch_id or 'test'}.pdf",
-        }
-    except Exception as e:
-        print(f"❌ ОШИБКА ПЕЧАТИ: {e}") # Пишем в консоль для отладки
-        raise HTTPException(status_code=500, detail=f"Print error: {e}")
\ No newline at end of file
+import os
+import logging
+import uuid
+import base64
+import asyncio
+from datetime import datetime
+from typing import Optional
+import pytz
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from app.models import PrintRequest
+from app.services.pdf import LABEL_RENDER_VERSION, iter_labels_pdf
+from app.services.pdf_cache import pdf_cache
+from app.services.print_jobs import print_jobs, QueueFullError
+from app.services.reprint import iter_reprint_pdf
+from app.database import supabase, get_async_supabase # Подключение к БД
+from app.services.batch_writer import create_batch_with_boxes, rollback_batch
+from app.services.batch_cache import batch_cache
+
+router = APIRouter()
+logger = logging.getLogger("Printing")
+TZ = pytz.timezone("Asia/Yekaterinburg")
+
+# Сколько секунд /api/print ждёт PDF для старых клиентов (без background)
+PRINT_SYNC_TIMEOUT = float(os.getenv("PRINT_SYNC_TIMEOUT", "120"))
+
+
+def batch_cache_key(batch_id) -> str:
+    # Версия вёрстки в ключе: после её смены PDF в старом виде из кэша не отдаются
+    return f"batch_{batch_id}_v{LABEL_RENDER_VERSION}"
+
+def _read_base64(path: str) -> str:
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8")
+
+
+@router.post("/api/print")
+async def api_print(req: PrintRequest):
+    """Создает партию и ставит PDF в очередь печати.
+
+    С background=True сразу возвращает id задания. Без него (текущий
+    планшет) ждёт готовый PDF и отдаёт его в pdf_base64, как раньше.
+    """
+    try:
+        now = datetime.now(TZ)
+        # Формируем полное название, как в старой программе
+        product_full = f"{req.type} {req.category} {req.recipe} {req.brand_name} ({req.items_per_box} шт/кор.)"
+
+        batch_id = None
+        boxes = []
+
+        # Что печатается на этикетке — сохраняем в партии для перепечатки
+        label_data = {
+            "type": req.type,
+            "category": req.category,
+            "recipe": req.recipe,
+            "brand": req.brand_name,
+            "items_per_box": req.items_per_box,
+            "date": now.strftime("%d.%m.%y"),
+            "time": now.strftime("%H:%M"),
+        }
+
+        # 1. Запись партии и коробок в БД
+        db = await get_async_supabase()
+        if db:
+            # ВАЖНО: Добавляем заглушки для полей user_name и machine_name, 
+            # чтобы Supabase не ругалась на ошибку 400
+            batch_data = {
+                "product_info": product_full,
+                "planned_quantity": req.count,
+                "batch_number": req.batch_number or "",
+                "user_name": "Печать на планшете", # <-- Заглушка
+                "machine_name": "Не назначена",    # <-- Заглушка
+                "label_info": label_data,
+            }
+
+            # 2. Партия + коробки кусками; при ошибке партия откатывается
+            batch, boxes = await create_batch_with_boxes(db, batch_data, req.count)
+            batch_id = batch["id"]
+            # Строка партии уже есть — сканы этой партии не будут читать её из БД
+            batch_cache.put(batch_id, batch)
+
+        else:
+            # Режим без БД (тестовый)
+            for _ in range(req.count):
+                boxes.append({"id": str(uuid.uuid4())})
+
+        # 3. Генерация PDF (в фоне)
+        filename = f"Batch_{batch_id or 'test'}.pdf"
+        cache_key = batch_cache_key(batch_id) if batch_id else f"test_{uuid.uuid4().hex}"
+        try:
+            job = print_jobs.submit(cache_key, boxes, len(boxes), label_data, filename, batch_id)
+        except QueueFullError:
+            # Этикетки не будут напечатаны — не оставляем партию без этикеток
+            if batch_id:
+                await rollback_batch(db, batch_id)
+                batch_cache.invalidate(batch_id)
+            raise
+
+        result = {
+            "success": True,
+            "batch_id": batch_id,
+            "job_id": job.id,
+            "status_url": f"/api/print/jobs/{job.id}",
+            "filename": filename,
+            "pdf_url": f"/api/print/{batch_id}.pdf" if batch_id else None,
+        }
+        if req.background:
+            return result
+
+        if not await asyncio.to_thread(job.wait, PRINT_SYNC_TIMEOUT):
+            result["success"] = False
+            result["message"] = "PDF ещё готовится, заберите его по status_url"
+            return result
+        if job.error:
+            # Этикеток не будет — откатываем партию, как и при переполненной очереди
+            if batch_id:
+                await rollback_batch(db, batch_id)
+                batch_cache.invalidate(batch_id)
+            raise Exception(job.error)
+
+        result["pdf_base64"] = await asyncio.to_thread(_read_base64, job.path)
+        return result
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.exception("❌ ОШИБКА ПЕЧАТИ: %s", e)
+        raise HTTPException(status_code=500, detail=f"Print error: {e}")
+
+
+BOXES_PAGE_SIZE = 1000  # PostgREST по умолчанию отдаёт не больше 1000 строк
+
+
+def iter_batch_boxes(batch_id: str, from_no: Optional[int] = None, to_no: Optional[int] = None):
+    """Коробки партии в порядке номеров, страницами — без загрузки всей партии"""
+    offset = 0
+    while True:
+        query = supabase.table("boxes").select("id,box_no").eq("batch_id", batch_id)
+        if from_no is not None:
+            query = query.gte("box_no", from_no)
+        if to_no is not None:
+            query = query.lte("box_no", to_no)
+        res = (
+            query.order("box_no")
+            .order("id")
+            .range(offset, offset + BOXES_PAGE_SIZE - 1)
+            .execute()
+        )
+        rows = res.data or []
+        yield from rows
+        if len(rows) < BOXES_PAGE_SIZE:
+            return
+        offset += BOXES_PAGE_SIZE
+
+
+def get_print_batch(batch_id: str) -> dict:
+    """Строка партии для печати (из кэша или БД); без данных этикетки — 404"""
+    if not supabase:
+        raise HTTPException(status_code=503, detail="Нет БД")
+
+    batch = batch_cache.get(batch_id)
+    if batch is None:
+        res = supabase.table("batches").select("*").eq("id", batch_id).execute()
+        if not res.data:
+            raise HTTPException(status_code=404, detail="Партия не найдена")
+        batch = res.data[0]
+        batch_cache.put(batch_id, batch)
+    if not batch.get("label_info"):
+        raise HTTPException(status_code=404, detail="Для партии не сохранены данные этикетки")
+    return batch
+
+
+@router.get("/api/print/{batch_id}.pdf")
+def api_print_pdf(batch_id: str):
+    """Этикетки партии потоком application/pdf (память не растёт с размером партии)"""
+    batch = get_print_batch(batch_id)
+    headers = {"Content-Disposition": f'inline; filename="Batch_{batch_id}.pdf"'}
+    cached = pdf_cache.get(batch_cache_key(batch_id))
+    if cached:
+        return FileResponse(cached, media_type="application/pdf", headers=headers)
+
+    # Отдаём потоком и заодно складываем в кэш для следующих перепечаток
+    # Коробки идут генератором; пул процессов нужен, только если партия большая
+    chunks = iter_labels_pdf(
+        iter_batch_boxes(batch_id), batch["label_info"], count=batch.get("planned_quantity"),
+    )
+    return StreamingResponse(
+        pdf_cache.stream_to(batch_cache_key(batch_id), chunks),
+        media_type="application/pdf",
+        headers=headers,
+    )
+
+
+@router.get("/api/batches/{batch_id}/labels")
+def api_batch_labels(
+    batch_id: str,
+    from_no: Optional[int] = Query(None, alias="from", ge=1),
+    to_no: Optional[int] = Query(None, alias="to", ge=1),
+):
+    """Перепечатка этикеток партии (всех или диапазона ?from=120&to=140).
+
+    Те же id и номера коробок, что и при первой печати; уже отрендеренные
+    куски берутся из кэша без повторного рендера.
+    """
+    if from_no is not None and to_no is not None and from_no > to_no:
+        raise HTTPException(status_code=400, detail="Начало диапазона больше конца")
+    batch = get_print_batch(batch_id)
+    planned = batch.get("planned_quantity")
+    count = None
+    if planned is not None:
+        count = max(0, min(to_no or planned, planned) - (from_no or 1) + 1)
+
+    suffix = f"_{from_no or 1}-{to_no}" if from_no or to_no else ""
+    return StreamingResponse(
+        iter_reprint_pdf(iter_batch_boxes(batch_id, from_no, to_no), batch["label_info"], count=count),
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'inline; filename="Batch_{batch_id}{suffix}.pdf"'},
+    )
+
+
+@router.get("/api/print/jobs/{job_id}")
+def api_print_job_status(job_id: str):
+    job = print_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задание печати не найдено")
+    return job.to_dict()
+
+
+@router.get("/api/print/jobs/{job_id}/pdf")
+def api_print_job_pdf(job_id: str):
+    job = print_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задание печати не найдено")
+    if job.status == "error":
+        raise HTTPException(status_code=500, detail=f"Print error: {job.error}")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail="PDF ещё готовится")
+
+    # Файл могли вытеснить из кэша — тогда попросим перепечатать партию
+    path = pdf_cache.get(job.cache_key)
+    if not path:
+        raise HTTPException(status_code=410, detail="PDF удалён из кэша, запросите печать заново")
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'inline; filename="{job.filename}"'},
+    )
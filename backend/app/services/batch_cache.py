@@ -0,0 +1,88 @@
+# Кэш строк партий (batches) в памяти процесса, общий для всех режимов сканирования.
+# Коробки одной паллеты относятся к одной партии, а её данные после печати
+# не меняются — поэтому строку партии не нужно перечитывать на каждом скане.
+# LRU ограничивает размер, TTL — срок, через который строку всё же перечитаем
+# (на случай правки партии напрямую в БД).
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.services.metrics import cache_result
+
+BATCH_CACHE_SIZE = int(os.getenv("BATCH_CACHE_SIZE", "5000"))
+BATCH_CACHE_TTL = float(os.getenv("BATCH_CACHE_TTL", "600"))
+
+# Колонки, которые меняются при сканировании — их в кэше не держим
+VOLATILE_COLUMNS = ("produced_count",)
+
+
+class BatchCache:
+    def __init__(self, max_size: int = BATCH_CACHE_SIZE, ttl: float = BATCH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # Ключ — str(batch_id): из URL приходит строка, из БД может прийти число.
+        # Значение — (строка партии, момент устаревания)
+        self._rows: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, batch_id) -> Optional[dict]:
+        """Строка партии или None (нет в кэше или устарела)"""
+        key = str(batch_id)
+        with self._lock:
+            entry = self._rows.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._rows[key]
+                self.misses += 1
+                cache_result("batches", "miss")
+                return None
+            self._rows.move_to_end(key)
+            self.hits += 1
+        cache_result("batches", "hit")
+        return entry[0]
+
+    def get_many(self, batch_ids: Iterable) -> Tuple[Dict[str, dict], List]:
+        """(найденные строки по строковому id, id, которые надо прочитать из БД)"""
+        found: Dict[str, dict] = {}
+        missing = []
+        for batch_id in batch_ids:
+            row = self.get(batch_id)
+            if row is None:
+                missing.append(batch_id)
+            else:
+                found[str(batch_id)] = row
+        return found, missing
+
+    def put(self, batch_id, row: dict) -> None:
+        row = {k: v for k, v in row.items() if k not in VOLATILE_COLUMNS}
+        key = str(batch_id)
+        with self._lock:
+            self._rows[key] = (row, time.monotonic() + self.ttl)
+            self._rows.move_to_end(key)
+            while len(self._rows) > self.max_size:
+                self._rows.popitem(last=False)
+
+    def invalidate(self, batch_id=None) -> None:
+        """Сброс одной партии (после её правки) или всего кэша"""
+        with self._lock:
+            if batch_id is None:
+                self._rows.clear()
+            else:
+                self._rows.pop(str(batch_id), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._rows),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+batch_cache = BatchCache()
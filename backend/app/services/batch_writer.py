@@ -0,0 +1,79 @@
+# Создание партии и её коробок для /api/print.
+# Коробки вставляются кусками по BOX_INSERT_CHUNK строк, несколько кусков
+# параллельно. Если что-то не записалось — удаляем уже вставленные коробки
+# и саму партию, чтобы в БД не оставалось партий-сирот.
+import asyncio
+import logging
+import os
+import uuid
+from typing import List, Tuple
+
+from postgrest.types import ReturnMethod
+from supabase import AsyncClient
+from app.services.metrics import timed
+
+logger = logging.getLogger("BatchWriter")
+
+BOX_INSERT_CHUNK = int(os.getenv("BOX_INSERT_CHUNK", "500"))
+BOX_INSERT_CONCURRENCY = int(os.getenv("BOX_INSERT_CONCURRENCY", "4"))
+# 1 — id коробок генерирует БД (RPC create_batch_boxes), приложение их только получает
+BOX_IDS_SERVER_SIDE = os.getenv("BOX_IDS_SERVER_SIDE", "").lower() in ("1", "true", "yes")
+
+
+@timed("print.create_batch")
+async def create_batch_with_boxes(db: AsyncClient, batch_data: dict, count: int) -> Tuple[dict, List[dict]]:
+    """Создаёт партию и count коробок; возвращает (строка партии, коробки по порядку номеров)"""
+    batch_res = await db.table("batches").insert(batch_data).execute()
+    if not batch_res.data:
+        raise Exception("Не удалось получить ID новой партии из БД")
+    batch = batch_res.data[0]
+    batch_id = batch["id"]
+
+    try:
+        if BOX_IDS_SERVER_SIDE:
+            res = await db.rpc("create_batch_boxes", {"p_batch_id": batch_id, "p_count": count}).execute()
+            ids = res.data or []
+            if len(ids) != count:
+                raise Exception(f"БД создала {len(ids)} коробок из {count}")
+            boxes = [
+                {"id": str(box_id), "batch_id": batch_id, "status": "CREATED", "box_no": box_no}
+                for box_no, box_id in enumerate(ids, start=1)
+            ]
+        else:
+            boxes = [
+                {"id": str(uuid.uuid4()), "batch_id": batch_id, "status": "CREATED", "box_no": box_no}
+                for box_no in range(1, count + 1)
+            ]
+            await insert_boxes(db, boxes)
+    except Exception:
+        await rollback_batch(db, batch_id)
+        raise
+
+    return batch, boxes
+
+
+async def insert_boxes(db: AsyncClient, boxes: List[dict]) -> None:
+    """Вставка кусками, до BOX_INSERT_CONCURRENCY запросов одновременно"""
+    semaphore = asyncio.Semaphore(BOX_INSERT_CONCURRENCY)
+
+    async def upload(chunk: List[dict]) -> None:
+        async with semaphore:
+            # returning=minimal: PostgREST не присылает вставленные строки обратно
+            await db.table("boxes").insert(chunk, returning=ReturnMethod.minimal).execute()
+
+    chunks = [boxes[i:i + BOX_INSERT_CHUNK] for i in range(0, len(boxes), BOX_INSERT_CHUNK)]
+    # Ждём все куски, даже если один упал: откат не должен обогнать вставку
+    results = await asyncio.gather(*(upload(c) for c in chunks), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+
+async def rollback_batch(db: AsyncClient, batch_id) -> None:
+    """Компенсация: убираем коробки и партию, созданные неудавшейся печатью"""
+    try:
+        await db.table("boxes").delete(returning=ReturnMethod.minimal).eq("batch_id", batch_id).execute()
+        await db.table("batches").delete(returning=ReturnMethod.minimal).eq("id", batch_id).execute()
+        logger.info("↩️ Партия %s откатена после ошибки печати", batch_id)
+    except Exception as e:
+        logger.error("❌ Не удалось откатить партию %s: %s", batch_id, e)
@@ -0,0 +1,177 @@
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from app.models import Brand
+
+# Латиница, которую на планшете легко набрать вместо кириллицы (и наоборот).
+# Приводим всё к кириллице, ё -> е.
+_LOOKALIKES = str.maketrans({
+    "a": "а", "b": "в", "c": "с", "e": "е", "h": "н", "k": "к", "m": "м",
+    "o": "о", "p": "р", "t": "т", "x": "х", "y": "у", "ё": "е",
+})
+_TOKEN_RE = re.compile(r"\w+")
+
+MAX_PREFIX = 12   # Длиннее префиксы не храним, дальше проверяем startswith
+NGRAM = 3         # Для поиска по середине слова
+
+
+def normalize(text: str) -> str:
+    return (text or "").lower().translate(_LOOKALIKES)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def _ngrams(token: str) -> Set[str]:
+    return {token[i:i + NGRAM] for i in range(len(token) - NGRAM + 1)}
+
+
+BrandKey = Tuple
+
+
+def _brand_key(brand: Brand) -> BrandKey:
+    return (
+        brand.brand_name, brand.type, brand.category, brand.recipe,
+        brand.items_per_box, brand.aliases,
+    )
+
+
+class _Doc:
+    def __init__(self, brand: Brand):
+        self.brand = brand
+        self.name = normalize(brand.brand_name).strip()
+        self.name_tokens = tokenize(brand.brand_name)
+        self.alias_tokens = tokenize(brand.aliases)
+        self.tokens = set(self.name_tokens) | set(self.alias_tokens)
+
+
+class BrandSearchIndex:
+    """Поиск брендов по названию и алиасам.
+
+    Префиксы токенов лежат в плоском словаре (префикс -> ключи брендов),
+    это тот же префиксный trie, только без обхода узлов. Для поиска по
+    середине слова есть карта триграмм. При смене списка брендов индекс
+    обновляется по разнице: удаляются пропавшие строки, добавляются новые.
+    """
+
+    def __init__(self):
+        self._docs: Dict[BrandKey, _Doc] = {}
+        self._prefix: Dict[str, Set[BrandKey]] = {}
+        self._ngram: Dict[str, Set[BrandKey]] = {}
+        self._source: Optional[List[Brand]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # --- Построение ---
+
+    def sync(self, brands: List[Brand]) -> None:
+        """Подтягивает индекс к текущему списку брендов.
+
+        Кэш справочников отдаёт один и тот же объект списка, пока снимок
+        не обновился, поэтому в обычном случае это одна проверка `is`.
+        """
+        if brands is self._source:
+            return
+        with self._lock:
+            if brands is self._source:
+                return
+            new_docs = {}
+            for brand in brands:
+                new_docs.setdefault(_brand_key(brand), brand)
+
+            for key in set(self._docs) - set(new_docs):
+                self._remove(key)
+            for key, brand in new_docs.items():
+                if key not in self._docs:
+                    self._add(key, _Doc(brand))
+            self._source = brands
+
+    def _add(self, key: BrandKey, doc: _Doc) -> None:
+        self._docs[key] = doc
+        for token in doc.tokens:
+            for i in range(1, min(len(token), MAX_PREFIX) + 1):
+                self._prefix.setdefault(token[:i], set()).add(key)
+            for gram in _ngrams(token):
+                self._ngram.setdefault(gram, set()).add(key)
+
+    def _remove(self, key: BrandKey) -> None:
+        doc = self._docs.pop(key)
+        for token in doc.tokens:
+            for i in range(1, min(len(token), MAX_PREFIX) + 1):
+                self._discard(self._prefix, token[:i], key)
+            for gram in _ngrams(token):
+                self._discard(self._ngram, gram, key)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[BrandKey]], term: str, key: BrandKey) -> None:
+        keys = index.get(term)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[term]
+
+    # --- Поиск ---
+
+    def _candidates(self, token: str) -> Set[BrandKey]:
+        found = set(self._prefix.get(token[:MAX_PREFIX], ()))
+        if len(token) >= NGRAM:
+            grams = _ngrams(token)
+            infix = None
+            for gram in grams:
+                keys = self._ngram.get(gram)
+                if not keys:
+                    infix = set()
+                    break
+                infix = set(keys) if infix is None else infix & keys
+            found |= infix or set()
+        return found
+
+    @staticmethod
+    def _token_score(doc: _Doc, token: str) -> float:
+        best = 0.0
+        for t in doc.name_tokens:
+            if t == token:
+                return 3.0
+            if t.startswith(token):
+                best = max(best, 2.0)
+            elif token in t:
+                best = max(best, 0.5)
+        for t in doc.alias_tokens:
+            if t == token:
+                best = max(best, 1.5)
+            elif t.startswith(token):
+                best = max(best, 1.0)
+            elif token in t:
+                best = max(best, 0.5)
+        return best
+
+    def search(self, query: str, limit: int = 20) -> List[Brand]:
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        q_norm = " ".join(tokens)
+
+        with self._lock:
+            keys: Optional[Set[BrandKey]] = None
+            for token in tokens:
+                found = self._candidates(token)
+                keys = found if keys is None else keys & found
+                if not keys:
+                    return []
+
+            scored = []
+            for key in keys:
+                doc = self._docs[key]
+                scores = [self._token_score(doc, t) for t in tokens]
+                if not all(scores):
+                    continue  # Ложное срабатывание префикса длиннее MAX_PREFIX
+                score = sum(scores)
+                if doc.name.startswith(q_norm):
+                    score += 3.0
+                scored.append((-score, len(doc.name), doc.name, doc.brand))
+
+        scored.sort(key=lambda item: item[:3])
+        return [item[3] for item in scored[:limit]]
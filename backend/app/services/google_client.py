@@ -0,0 +1,125 @@
+# Общая фабрика клиентов Google API для чтения справочников и записи отчётов.
+# Ключ сервисного аккаунта читается один раз на процесс, discovery-документ
+# берётся из библиотеки (без запроса к Google и без разбора на каждый вызов),
+# а HTTP-соединение с keep-alive переиспользуется между вызовами.
+# httplib2 не потокобезопасен, поэтому у каждого потока свой клиент.
+import json
+import logging
+import os
+import threading
+from typing import Optional
+from urllib.parse import urlparse
+
+import google_auth_httplib2
+import httplib2
+from google.auth.credentials import AnonymousCredentials
+from google.oauth2 import service_account
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+from app.services.metrics import dependency_call
+
+logger = logging.getLogger("GoogleClient")
+
+CREDENTIALS_FILE = "service_account.json"
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+GOOGLE_HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "30"))
+# Свой адрес Sheets API вместо https://sheets.googleapis.com/ — для локальной
+# заглушки в benchmarks/fakes (ключ сервисного аккаунта тогда не нужен)
+GOOGLE_API_ENDPOINT = os.getenv("GOOGLE_API_ENDPOINT")
+
+_lock = threading.Lock()
+_creds_loaded = False
+_creds: Optional[service_account.Credentials] = None
+_sheets_doc: Optional[str] = None
+_local = threading.local()
+
+
+def get_credentials() -> Optional[service_account.Credentials]:
+    """Учётные данные сервисного аккаунта (загружаются один раз).
+
+    1) Сначала переменная окружения GOOGLE_SERVICE_ACCOUNT_JSON (удобно для Railway)
+    2) Если её нет — файл service_account.json рядом с backend
+    """
+    global _creds_loaded, _creds
+    if _creds_loaded:
+        return _creds
+
+    with _lock:
+        if _creds_loaded:
+            return _creds
+
+        env_json = os.environ.get("GOOGLE_SERVICE_ACCOUNT_JSON")
+        if env_json:
+            try:
+                _creds = service_account.Credentials.from_service_account_info(
+                    json.loads(env_json), scopes=SCOPES
+                )
+                logger.info("✅ Авторизация Google через переменную окружения прошла успешно")
+            except Exception as e:
+                logger.error("❌ Ошибка авторизации Google из окружения: %s", e)
+
+        if _creds is None:
+            if os.path.exists(CREDENTIALS_FILE):
+                try:
+                    _creds = service_account.Credentials.from_service_account_file(
+                        CREDENTIALS_FILE, scopes=SCOPES
+                    )
+                    logger.info("✅ Авторизация Google через файл service_account.json прошла успешно")
+                except Exception as e:
+                    logger.error("❌ Ошибка авторизации Google из файла: %s", e)
+            else:
+                logger.warning(
+                    "⚠️ Файл %s не найден и переменная GOOGLE_SERVICE_ACCOUNT_JSON не задана",
+                    CREDENTIALS_FILE,
+                )
+
+        _creds_loaded = True
+        return _creds
+
+
+def _get_sheets_doc() -> str:
+    global _sheets_doc
+    if _sheets_doc is None:
+        # Discovery-документ, который поставляется вместе с google-api-python-client
+        _sheets_doc = discovery_cache.get_static_doc("sheets", "v4")
+        if _sheets_doc is None:
+            raise RuntimeError("Нет встроенного discovery-документа sheets v4")
+    return _sheets_doc
+
+
+def sheets_operation(method: str, uri: str) -> str:
+    """Короткое имя вызова Sheets API для метрик: get, values:batchGet, values:append, batchUpdate"""
+    tail = urlparse(uri).path.split("/spreadsheets/", 1)[-1]
+    parts = tail.split("/")
+    if len(parts) == 1:
+        return parts[0].split(":", 1)[1] if ":" in parts[0] else method.lower()
+    action = parts[-1].split(":", 1)[1] if ":" in parts[-1] else method.lower()
+    return f"{parts[1].split(':', 1)[0]}:{action}"
+
+
+class _TimedHttp(google_auth_httplib2.AuthorizedHttp):
+    def request(self, uri, method="GET", *args, **kwargs):
+        with dependency_call("google_sheets", sheets_operation(method, uri)):
+            return super().request(uri, method, *args, **kwargs)
+
+
+def get_sheets():
+    """Клиент Sheets API для текущего потока, или None без учётных данных"""
+    service = getattr(_local, "sheets", None)
+    if service is not None:
+        return service
+
+    creds = get_credentials()
+    if creds is None:
+        if not GOOGLE_API_ENDPOINT:
+            return None
+        creds = AnonymousCredentials()
+
+    # Один httplib2.Http на поток: соединение остаётся открытым между запросами,
+    # а токен обновляется в общем объекте creds только по истечении срока
+    http = _TimedHttp(creds, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+    client_options = {"api_endpoint": GOOGLE_API_ENDPOINT} if GOOGLE_API_ENDPOINT else None
+    service = build_from_document(_get_sheets_doc(), http=http, client_options=client_options)
+    _local.sheets = service
+    return service
@@ -1,293 +1,444 @@
-import os
-import json
-from typing import List, Any
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from app.models import User, Machine, Brand
-
-CREDENTIALS_FILE = "service_account.json"
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-
-
-class GoogleSheetsService:
-    def __init__(self):
-        self.creds = None
-        self.service = None
-        # ВАЖНО: Убедитесь, что тут ваш правильный ID таблицы
-        self.config_sheet_id = "1fdldtl7fOCM97ZNMZS4BrePyGKPNOJkySa3bZ_Y6mfA"
-        self._authenticate()
-
-    def _authenticate(self):
-        """Авторизация к Google Sheets.
-        1) Сначала пробуем взять JSON из переменной окружения GOOGLE_SERVICE_ACCOUNT_JSON
-        2) Если её нет — пробуем файл service_account.json рядом с backend
-        """
-        # 1. Пробуем переменную окружения (удобно для Railway)
-        env_json = os.environ.get("GOOGLE_SERVICE_ACCOUNT_JSON")
-        if env_json:
-            try:
-                info = json.loads(env_json)
-                self.creds = service_account.Credentials.from_service_account_info(
-                    info, scopes=SCOPES
-                )
-                self.service = build("sheets", "v4", credentials=self.creds)
-                print("✅ Авторизация Google через переменную окружения прошла успешно")
-                return
-            except Exception as e:
-                print(f"❌ Ошибка авторизации Google из окружения: {e}")
-
-        # 2. Файл service_account.json (локальный запуск)
-        if os.path.exists(CREDENTIALS_FILE):
-            try:
-                self.creds = service_account.Credentials.from_service_account_file(
-                    CREDENTIALS_FILE, scopes=SCOPES
-                )
-                self.service = build("sheets", "v4", credentials=self.creds)
-                print("✅ Авторизация Google через файл service_account.json прошла успешно")
-            except Exception as e:
-                print(f"❌ Ошибка авторизации Google из файла: {e}")
-        else:
-            print(
-                f"⚠️ Файл {CREDENTIALS_FILE} не найден и переменная "
-                f"GOOGLE_SERVICE_ACCOUNT_JSON не задана"
-            )
-
-    def _get_values(self, sheet_names: List[str]) -> List[List[str]]:
-        """Ищет данные в одном из перечисленных листов"""
-        if not self.service or not self.config_sheet_id:
-            print("⚠️ _get_values: нет self.service или config_sheet_id")
-            return []
-
-        for name in sheet_names:
-            range_name = f"'{name}'!A1:Z2000"
-            try:
-                result = (
-                    self.service.spreadsheets()
-                    .values()
-                    .get(spreadsheetId=self.config_sheet_id, range=range_name)
-                    .execute()
-                )
-                values = result.get("values", [])
-                if values:
-                    # print(f"   ℹ️ Данные найдены на листе: {name}")
-                    return values
-            except Exception as e:
-                print(f"⚠️ Ошибка чтения листа '{name}': {e}")
-                continue
-
-        print(f"⚠️ Не удалось найти листы с именами: {sheet_names}")
-        return []
-
-    def _find_exact_col(self, header: List[str], candidates: List[str]) -> int:
-        """Ищет колонку по точному совпадению или частичному, если точного нет"""
-        header_lower = [str(h).lower().strip() for h in header]
-
-        # 1. Сначала ищем точное совпадение
-        for cand in candidates:
-            cand_lower = cand.lower().strip()
-            if cand_lower in header_lower:
-                return header_lower.index(cand_lower)
-
-        # 2. Потом допускаем частичное совпадение
-        for i, col in enumerate(header_lower):
-            for cand in candidates:
-                cand_lower = cand.lower().strip()
-                if cand_lower in col:
-                    return i
-        return -1
-
-    def get_users(self) -> List[User]:
-        """
-        Читает лист users и возвращает список User.
-        Берём только Имя + PIN, без фильтра по 'Активен',
-        чтобы ничего случайно не отфильтровать.
-        """
-        rows = self._get_values(["users", "brands - users", "Users", "Пользователи"])
-        if not rows:
-            print("get_users: не нашли ни одного листа users")
-            return []
-
-        header = rows[0]
-        data = rows[1:]
-
-        # Ищем колонки "Имя" и "PIN"
-        idx_name = self._find_exact_col(header, ["Имя", "Name"])
-        idx_pin = self._find_exact_col(header, ["PIN", "Пин", "Pin"])
-
-        print(
-            "get_users: индексы колонок -> idx_name={0}, idx_pin={1}".format(
-                idx_name, idx_pin
-            )
-        )
-
-        users: List[User] = []
-
-        for i, row in enumerate(data, start=2):  # 2-я строка, т.к. 1-я — заголовки
-            if idx_name == -1 or len(row) <= idx_name:
-                continue
-
-            name = str(row[idx_name]).strip()
-            if not name:
-                continue
-
-            pin = "0000"
-            if idx_pin != -1 and len(row) > idx_pin:
-                val = str(row[idx_pin]).strip()
-                if val:
-                    pin = val
-
-            # Просто добавляем всех — без поля "Активен"
-            users.append(User(name=name, pin_code=pin, is_active=True))
-
-        print("get_users: загружено пользователей:", len(users))
-        if users:
-            try:
-                example = users[0]
-                if hasattr(example, "dict"):
-                    print("get_users: пример первой записи:", example.dict())
-                elif hasattr(example, "model_dump"):
-                    print("get_users: пример первой записи:", example.model_dump())
-                else:
-                    print("get_users: пример первой записи (raw):", example)
-            except Exception as e:
-                print("get_users: не удалось вывести пример записи:", e)
-
-        return users
-
-    def get_machines(self) -> List[Machine]:
-        # Ищем лист machines (или brands - machines)
-        rows = self._get_values(["machines", "brands - machines", "Machine_Settings"])
-        if not rows:
-            print("get_machines: не нашли ни одного листа")
-            return []
-
-        header = rows[0]
-        data = rows[1:]
-
-        # Ваши заголовки: Machine_ID, Name, Types, Categories, Active
-        idx_id = self._find_exact_col(header, ["Machine_ID", "ID"])
-        idx_name = self._find_exact_col(header, ["Name", "Имя"])
-        idx_type = self._find_exact_col(header, ["Types", "Type_Allowed", "Тип"])
-        idx_cat = self._find_exact_col(header, ["Categories", "Category_Allowed"])
-        idx_active = self._find_exact_col(header, ["Active", "Активен"])
-
-        machines: List[Machine] = []
-
-        for i, row in enumerate(data, start=2):
-            if idx_name == -1 or len(row) <= idx_name:
-                continue
-
-            name = str(row[idx_name]).strip()
-            if not name:
-                continue
-
-            m_id = f"mach_{i}"
-            if idx_id != -1 and len(row) > idx_id:
-                val = str(row[idx_id]).strip()
-                if val:
-                    m_id = val
-
-            is_active = True
-            if idx_active != -1 and len(row) > idx_active:
-                if str(row[idx_active]).lower() not in ["true", "1", "yes"]:
-                    is_active = False
-
-            if is_active:
-                type_allowed = (
-                    str(row[idx_type]).strip()
-                    if idx_type != -1 and len(row) > idx_type
-                    else ""
-                )
-                cat_allowed = (
-                    str(row[idx_cat]).strip()
-                    if idx_cat != -1 and len(row) > idx_cat
-                    else ""
-                )
-
-                machines.append(
-                    Machine(
-                        id=m_id,
-                        name=name,
-                        type_allowed=type_allowed,
-                        category_allowed=cat_allowed,
-                        is_active=True,
-                    )
-                )
-
-        return machines
-
-    def get_brands(self) -> List[Brand]:
-        # Ищем лист brands
-        rows = self._get_values(["brands", "brands - brands", "Бренды"])
-        if not rows:
-            print("get_brands: лист 'brands' пустой или не найден")
-            return []
-
-        header = rows[0]
-        data = rows[1:]
-
-        # Ваши заголовки: Тип, Категория, Рецептура, Бренд, кол-во шт в коробке, aliases
-        # ВАЖНО: Ищем "Бренд" (короткое имя), а не "brand_1c"
-        idx_brand = self._find_exact_col(header, ["Бренд", "Brand"])
-        idx_type = self._find_exact_col(header, ["Тип", "Type"])
-        idx_cat = self._find_exact_col(header, ["Категория", "Category"])
-        idx_rec = self._find_exact_col(header, ["Рецептура", "Recipe"])
-        idx_qty = self._find_exact_col(header, ["кол-во шт в коробке", "items", "qty"])
-        idx_alias = self._find_exact_col(header, ["aliases", "алиасы"])
-
-        print(
-            "get_brands: индексы колонок -> "
-            "idx_brand={0}, idx_type={1}, idx_cat={2}, idx_rec={3}, idx_qty={4}, idx_alias={5}".format(
-                idx_brand, idx_type, idx_cat, idx_rec, idx_qty, idx_alias
-            )
-        )
-
-        brands: List[Brand] = []
-
-        for row in data:
-            if idx_brand == -1 or len(row) <= idx_brand:
-                continue
-
-            b_name = str(row[idx_brand]).strip()
-            if not b_name:
-                continue
-
-            qty = 0
-            if idx_qty != -1 and len(row) > idx_qty:
-                val = str(row[idx_qty]).strip()
-                if val.isdigit():
-                    qty = int(val)
-
-            brands.append(
-                Brand(
-                    brand_name=b_name,
-                    type=str(row[idx_type]).strip()
-                    if idx_type != -1 and len(row) > idx_type
-                    else "",
-                    category=str(row[idx_cat]).strip()
-                    if idx_cat != -1 and len(row) > idx_cat
-                    else "",
-                    recipe=str(row[idx_rec]).strip()
-                    if idx_rec != -1 and len(row) > idx_rec
-                    else "",
-                    items_per_box=qty,
-                    aliases=str(row[idx_alias]).strip()
-                    if idx_alias != -1 and len(row) > idx_alias
-                    else "",
-                )
-            )
-
-        print("get_brands: загружено брендов:", len(brands))
-        if brands:
-            try:
-                example = brands[0]
-                if hasattr(example, "dict"):
-                    print("get_brands: пример первой записи:", example.dict())
-                elif hasattr(example, "model_dump"):
-                    print("get_brands: пример первой записи:", example.model_dump())
-                else:
-                    print("get_brands: пример первой записи (raw):", example)
-            except Exception as e:
-                print("get_brands: не удалось вывести пример записи:", e)
-
-        return brands
+import os
+import hashlib
+import logging
+import hmac
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Any, Callable, Dict, Optional
+from app.models import User, Machine, Brand
+from app.services import google_client
+from app.services.metrics import cache_result, timed
+
+logger = logging.getLogger("GoogleSheets")
+
+# Сколько секунд справочники (users/machines/brands) считаются свежими.
+# После истечения отдаём старые данные и обновляем их в фоне.
+CACHE_TTL = float(os.getenv("SHEETS_CACHE_TTL", "300"))
+
+# Возможные названия листов в таблице настроек (берётся первый найденный)
+SHEET_CANDIDATES = {
+    "users": ["users", "brands - users", "Users", "Пользователи"],
+    "machines": ["machines", "brands - machines", "Machine_Settings"],
+    "brands": ["brands", "brands - brands", "Бренды"],
+}
+
+
+# Соль живёт только в памяти процесса: хэши нигде не сохраняются,
+# они нужны лишь для того, чтобы не держать и не сравнивать ПИНы открытым текстом
+_PIN_SALT = os.urandom(16)
+
+
+def normalize_user_name(name: Any) -> str:
+    """Ключ для поиска пользователя: без лишних пробелов и регистра"""
+    return " ".join(str(name or "").split()).casefold()
+
+
+def _hash_pin(pin: Any) -> bytes:
+    return hashlib.sha256(_PIN_SALT + str(pin or "").strip().encode("utf-8")).digest()
+
+
+class UserIndex:
+    """Пользователи по нормализованному имени + хэши ПИНов"""
+
+    def __init__(self, users: List[User]):
+        self._by_name: Dict[str, Any] = {}
+        for user in users:
+            # При дублях имён побеждает первая строка — как раньше в next(...)
+            self._by_name.setdefault(
+                normalize_user_name(user.name), (user, _hash_pin(user.pin_code))
+            )
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def get(self, name: Any) -> Optional[User]:
+        found = self._by_name.get(normalize_user_name(name))
+        return found[0] if found else None
+
+    def check_pin(self, name: Any, pin: Any) -> Optional[User]:
+        """Возвращает пользователя, если ПИН подошёл, иначе None"""
+        found = self._by_name.get(normalize_user_name(name))
+        if found is None:
+            # Сравниваем с пустышкой, чтобы время ответа не выдавало,
+            # есть такой пользователь или нет
+            hmac.compare_digest(_hash_pin(pin), _hash_pin(None))
+            return None
+        user, pin_hash = found
+        return user if hmac.compare_digest(_hash_pin(pin), pin_hash) else None
+
+
+class SheetsSnapshot:
+    """Все справочники из одного чтения таблицы"""
+
+    def __init__(
+        self,
+        users: Optional[List[User]] = None,
+        machines: Optional[List[Machine]] = None,
+        brands: Optional[List[Brand]] = None,
+    ):
+        self.users = users or []
+        self.machines = machines or []
+        self.brands = brands or []
+        self.user_index = UserIndex(self.users)
+
+    def __bool__(self) -> bool:
+        return bool(self.users or self.machines or self.brands)
+
+
+class _CacheEntry:
+    def __init__(self, value: Any):
+        self.value = value
+        self.loaded_at = time.monotonic()
+        self.refreshing = False
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.monotonic() - self.loaded_at < ttl
+
+
+class GoogleSheetsService:
+    def __init__(self, cache_ttl: float = CACHE_TTL):
+        self.creds = google_client.get_credentials()
+        # ВАЖНО: Убедитесь, что тут ваш правильный ID таблицы
+        self.config_sheet_id = "1fdldtl7fOCM97ZNMZS4BrePyGKPNOJkySa3bZ_Y6mfA"
+        self.cache_ttl = cache_ttl
+        self._cache: Dict[str, _CacheEntry] = {}
+        self._cache_lock = threading.Lock()
+        # Отдельный замок на загрузку: при холодном старте 20 планшетов
+        # ждут один запрос к Google, а не делают 20 своих
+        self._load_lock = threading.Lock()
+        self._sheet_titles: Optional[Dict[str, str]] = None
+        # Фоновые обновления — в одном долгоживущем потоке: клиент Sheets
+        # собирается на поток (google_client.get_sheets), и новый поток
+        # на каждое обновление заново собирал бы его из discovery-документа
+        self._refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheets-refresh")
+
+    @property
+    def service(self):
+        """Клиент Sheets API текущего потока (общий с записью отчётов)"""
+        return google_client.get_sheets()
+
+    # --- Кэш справочников ---
+
+    def _cached(self, key: str, loader: Callable[[], Any]) -> Any:
+        """Отдаёт данные из памяти; Sheets дёргаем не чаще раза в cache_ttl.
+
+        Протухшая запись отдаётся как есть, а обновление уходит в фон
+        (stale-while-revalidate). Пустые результаты не кэшируем — обычно
+        это ошибка чтения, и на следующем запросе стоит попробовать снова.
+        """
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                fresh = entry.is_fresh(self.cache_ttl)
+                if not fresh and not entry.refreshing:
+                    entry.refreshing = True
+                    self._refresher.submit(self._refresh, key, loader)
+                cache_result("sheets", "hit" if fresh else "stale")
+                return entry.value
+
+        cache_result("sheets", "miss")
+
+        with self._load_lock:
+            # Пока ждали замок, данные мог загрузить соседний поток
+            with self._cache_lock:
+                entry = self._cache.get(key)
+                if entry is not None:
+                    return entry.value
+            value = loader()
+            if value:
+                with self._cache_lock:
+                    self._cache[key] = _CacheEntry(value)
+            return value
+
+    def _refresh(self, key: str, loader: Callable[[], Any]) -> None:
+        try:
+            value = loader()
+        except Exception as e:
+            value = None
+            logger.warning("⚠️ Фоновое обновление '%s' не удалось: %s", key, e)
+
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if value:
+                self._cache[key] = _CacheEntry(value)
+            elif entry is not None:
+                # Оставляем старые данные, попробуем снова после следующего запроса
+                entry.refreshing = False
+
+    def invalidate(self) -> None:
+        """Сбрасывает кэш справочников и найденные названия листов"""
+        with self._cache_lock:
+            self._cache.clear()
+            self._sheet_titles = None
+
+    # --- Загрузка снимка справочников ---
+
+    def _resolve_titles(self) -> Dict[str, str]:
+        """Находит реальные названия листов по метаданным таблицы.
+
+        Один запрос spreadsheets.get вместо перебора имён через values.get
+        (каждое несуществующее имя — это отдельный 400 от Google).
+        Результат запоминаем до invalidate().
+        """
+        if self._sheet_titles is not None:
+            return self._sheet_titles
+
+        meta = (
+            self.service.spreadsheets()
+            .get(spreadsheetId=self.config_sheet_id, fields="sheets.properties.title")
+            .execute()
+        )
+        existing = [s["properties"]["title"] for s in meta.get("sheets", [])]
+        by_lower = {t.lower().strip(): t for t in existing}
+
+        titles: Dict[str, str] = {}
+        for kind, candidates in SHEET_CANDIDATES.items():
+            for cand in candidates:
+                title = by_lower.get(cand.lower().strip())
+                if title:
+                    titles[kind] = title
+                    break
+            else:
+                logger.warning("⚠️ Не удалось найти листы с именами: %s", candidates)
+
+        self._sheet_titles = titles
+        return titles
+
+    @timed("sheets.load_snapshot")
+    def _load_snapshot(self) -> "SheetsSnapshot":
+        """Читает users, machines и brands одним values.batchGet"""
+        if not self.service or not self.config_sheet_id:
+            logger.warning("⚠️ _load_snapshot: нет self.service или config_sheet_id")
+            return SheetsSnapshot()
+
+        try:
+            titles = self._resolve_titles()
+            kinds = list(titles)
+            if not kinds:
+                return SheetsSnapshot()
+
+            ranges = ["'{0}'!A1:Z2000".format(titles[k].replace("'", "''")) for k in kinds]
+            result = (
+                self.service.spreadsheets()
+                .values()
+                .batchGet(spreadsheetId=self.config_sheet_id, ranges=ranges)
+                .execute()
+            )
+        except Exception as e:
+            # Лист могли переименовать — в следующий раз перечитаем метаданные
+            self._sheet_titles = None
+            logger.warning("⚠️ Ошибка чтения справочников: %s", e)
+            return SheetsSnapshot()
+
+        rows = {
+            kind: vr.get("values", [])
+            for kind, vr in zip(kinds, result.get("valueRanges", []))
+        }
+        return SheetsSnapshot(
+            users=self._parse_users(rows.get("users", [])),
+            machines=self._parse_machines(rows.get("machines", [])),
+            brands=self._parse_brands(rows.get("brands", [])),
+        )
+
+    def _find_exact_col(self, header: List[str], candidates: List[str]) -> int:
+        """Ищет колонку по точному совпадению или частичному, если точного нет"""
+        header_lower = [str(h).lower().strip() for h in header]
+
+        # 1. Сначала ищем точное совпадение
+        for cand in candidates:
+            cand_lower = cand.lower().strip()
+            if cand_lower in header_lower:
+                return header_lower.index(cand_lower)
+
+        # 2. Потом допускаем частичное совпадение
+        for i, col in enumerate(header_lower):
+            for cand in candidates:
+                cand_lower = cand.lower().strip()
+                if cand_lower in col:
+                    return i
+        return -1
+
+    def get_snapshot(self) -> "SheetsSnapshot":
+        return self._cached("snapshot", self._load_snapshot)
+
+    def get_users(self) -> List[User]:
+        return self.get_snapshot().users
+
+    def get_machines(self) -> List[Machine]:
+        return self.get_snapshot().machines
+
+    def get_brands(self) -> List[Brand]:
+        return self.get_snapshot().brands
+
+    def check_login(self, user_name: Any, pin_code: Any) -> Optional[User]:
+        """Проверка ПИНа по индексу в памяти, без обращения к Google"""
+        return self.get_snapshot().user_index.check_pin(user_name, pin_code)
+
+    def _parse_users(self, rows: List[List[str]]) -> List[User]:
+        """
+        Разбирает лист users в список User.
+        Берём только Имя + PIN, без фильтра по 'Активен',
+        чтобы ничего случайно не отфильтровать.
+        """
+        if not rows:
+            logger.warning("get_users: не нашли ни одного листа users")
+            return []
+
+        header = rows[0]
+        data = rows[1:]
+
+        # Ищем колонки "Имя" и "PIN"
+        idx_name = self._find_exact_col(header, ["Имя", "Name"])
+        idx_pin = self._find_exact_col(header, ["PIN", "Пин", "Pin"])
+
+        logger.debug(
+            "get_users: индексы колонок -> idx_name=%s, idx_pin=%s", idx_name, idx_pin,
+            extra={"sample": True},
+        )
+
+        users: List[User] = []
+
+        for i, row in enumerate(data, start=2):  # 2-я строка, т.к. 1-я — заголовки
+            if idx_name == -1 or len(row) <= idx_name:
+                continue
+
+            name = str(row[idx_name]).strip()
+            if not name:
+                continue
+
+            pin = "0000"
+            if idx_pin != -1 and len(row) > idx_pin:
+                val = str(row[idx_pin]).strip()
+                if val:
+                    pin = val
+
+            # Просто добавляем всех — без поля "Активен"
+            users.append(User(name=name, pin_code=pin, is_active=True))
+
+        # Пример записи не печатаем: в нём ПИН открытым текстом
+        logger.info("get_users: загружено пользователей: %s", len(users))
+        return users
+
+    def _parse_machines(self, rows: List[List[str]]) -> List[Machine]:
+        if not rows:
+            logger.warning("get_machines: не нашли ни одного листа")
+            return []
+
+        header = rows[0]
+        data = rows[1:]
+
+        # Ваши заголовки: Machine_ID, Name, Types, Categories, Active
+        idx_id = self._find_exact_col(header, ["Machine_ID", "ID"])
+        idx_name = self._find_exact_col(header, ["Name", "Имя"])
+        idx_type = self._find_exact_col(header, ["Types", "Type_Allowed", "Тип"])
+        idx_cat = self._find_exact_col(header, ["Categories", "Category_Allowed"])
+        idx_active = self._find_exact_col(header, ["Active", "Активен"])
+
+        machines: List[Machine] = []
+
+        for i, row in enumerate(data, start=2):
+            if idx_name == -1 or len(row) <= idx_name:
+                continue
+
+            name = str(row[idx_name]).strip()
+            if not name:
+                continue
+
+            m_id = f"mach_{i}"
+            if idx_id != -1 and len(row) > idx_id:
+                val = str(row[idx_id]).strip()
+                if val:
+                    m_id = val
+
+            is_active = True
+            if idx_active != -1 and len(row) > idx_active:
+                if str(row[idx_active]).lower() not in ["true", "1", "yes"]:
+                    is_active = False
+
+            if is_active:
+                type_allowed = (
+                    str(row[idx_type]).strip()
+                    if idx_type != -1 and len(row) > idx_type
+                    else ""
+                )
+                cat_allowed = (
+                    str(row[idx_cat]).strip()
+                    if idx_cat != -1 and len(row) > idx_cat
+                    else ""
+                )
+
+                machines.append(
+                    Machine(
+                        id=m_id,
+                        name=name,
+                        type_allowed=type_allowed,
+                        category_allowed=cat_allowed,
+                        is_active=True,
+                    )
+                )
+
+        return machines
+
+    def _parse_brands(self, rows: List[List[str]]) -> List[Brand]:
+        if not rows:
+            logger.warning("get_brands: лист 'brands' пустой или не найден")
+            return []
+
+        header = rows[0]
+        data = rows[1:]
+
+        # Ваши заголовки: Тип, Категория, Рецептура, Бренд, кол-во шт в коробке, aliases
+        # ВАЖНО: Ищем "Бренд" (короткое имя), а не "brand_1c"
+        idx_brand = self._find_exact_col(header, ["Бренд", "Brand"])
+        idx_type = self._find_exact_col(header, ["Тип", "Type"])
+        idx_cat = self._find_exact_col(header, ["Категория", "Category"])
+        idx_rec = self._find_exact_col(header, ["Рецептура", "Recipe"])
+        idx_qty = self._find_exact_col(header, ["кол-во шт в коробке", "items", "qty"])
+        idx_alias = self._find_exact_col(header, ["aliases", "алиасы"])
+
+        logger.debug(
+            "get_brands: индексы колонок -> "
+            "idx_brand=%s, idx_type=%s, idx_cat=%s, idx_rec=%s, idx_qty=%s, idx_alias=%s",
+            idx_brand, idx_type, idx_cat, idx_rec, idx_qty, idx_alias,
+            extra={"sample": True},
+        )
+
+        brands: List[Brand] = []
+
+        for row in data:
+            if idx_brand == -1 or len(row) <= idx_brand:
+                continue
+
+            b_name = str(row[idx_brand]).strip()
+            if not b_name:
+                continue
+
+            qty = 0
+            if idx_qty != -1 and len(row) > idx_qty:
+                val = str(row[idx_qty]).strip()
+                if val.isdigit():
+                    qty = int(val)
+
+            brands.append(
+                Brand(
+                    brand_name=b_name,
+                    type=str(row[idx_type]).strip()
+                    if idx_type != -1 and len(row) > idx_type
+                    else "",
+                    category=str(row[idx_cat]).strip()
+                    if idx_cat != -1 and len(row) > idx_cat
+                    else "",
+                    recipe=str(row[idx_rec]).strip()
+                    if idx_rec != -1 and len(row) > idx_rec
+                    else "",
+                    items_per_box=qty,
+                    aliases=str(row[idx_alias]).strip()
+                    if idx_alias != -1 and len(row) > idx_alias
+                    else "",
+                )
+            )
+
+        logger.info("get_brands: загружено брендов: %s", len(brands))
+
+        return brands
@@ -0,0 +1,120 @@
+# Сессии инвентаризации.
+# Каждый скан сессии пишется в inventory_scans — это и есть источник правды:
+# итог при завершении считается по ним, без доверия к цифрам с планшета.
+# В памяти воркера сессия нужна, чтобы не записывать одну коробку дважды
+# и сразу показывать прогресс; при нескольких воркерах её счётчики видят
+# только свои сканы. После перезапуска (или вытеснения) сессия
+# восстанавливается из БД.
+import os
+from collections import Counter, OrderedDict
+from typing import List, Optional, Set
+
+from app.services.scan_repo import ScanRepository
+
+INVENTORY_SESSIONS_MAX = int(os.getenv("INVENTORY_SESSIONS_MAX", "200"))
+
+UNKNOWN_PRODUCT = "Неизвестный продукт"
+
+
+class InventorySession:
+    def __init__(self, session_id: str, user_name: Optional[str] = None):
+        self.id = session_id
+        self.user_name = user_name
+        self.boxes: Set[str] = set()
+        self.counts: Counter = Counter()
+
+    def add(self, box_id: str, product: Optional[str]) -> bool:
+        """Учитывает коробку; False — она уже была в этой сессии"""
+        if box_id in self.boxes:
+            return False
+        self.boxes.add(box_id)
+        self.counts[product or UNKNOWN_PRODUCT] += 1
+        return True
+
+    def discard(self, box_id: str, product: Optional[str]) -> None:
+        if box_id in self.boxes:
+            self.boxes.discard(box_id)
+            key = product or UNKNOWN_PRODUCT
+            self.counts[key] -= 1
+            if self.counts[key] <= 0:
+                del self.counts[key]
+
+    @property
+    def total(self) -> int:
+        return len(self.boxes)
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.id,
+            "user_name": self.user_name,
+            "total": self.total,
+            "stats": dict(self.counts.most_common()),
+        }
+
+
+class InventorySessions:
+    def __init__(self, max_sessions: int = INVENTORY_SESSIONS_MAX):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, InventorySession]" = OrderedDict()
+
+    async def start(self, repo: ScanRepository, user_name: Optional[str]) -> InventorySession:
+        row = await repo.create_inventory_session(user_name)
+        session = InventorySession(str(row["id"]), user_name)
+        self._remember(session)
+        return session
+
+    async def get(self, repo: ScanRepository, session_id: str) -> Optional[InventorySession]:
+        """Сессия из памяти, а если её там нет — собранная заново из inventory_scans"""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            return session
+
+        row = await repo.get_inventory_session(session_id)
+        if not row or row.get("finished_at"):
+            return None
+        scans = await repo.get_inventory_scans(session_id)
+
+        # Пока шли запросы, сессию мог поднять параллельный скан — берём его копию
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = InventorySession(session_id, row.get("user_name"))
+            for scan in scans:
+                session.add(str(scan["box_id"]), scan.get("product"))
+            self._remember(session)
+        return session
+
+    async def record(self, repo: ScanRepository, session: InventorySession, scans: List[dict]) -> List[dict]:
+        """Добавляет сканы [{"box_id", "product"}] в сессию; возвращает те из них, что новые"""
+        # Счётчики меняются до первого await, поэтому параллельные сканы
+        # одной коробки не посчитаются дважды
+        new = [s for s in scans if session.add(s["box_id"], s.get("product"))]
+        try:
+            await repo.add_inventory_scans([
+                {"session_id": session.id, "box_id": s["box_id"], "product": s.get("product")}
+                for s in new
+            ])
+        except Exception:
+            # Не записалось в БД — не считаем и в памяти, чтобы итоги совпадали
+            for s in new:
+                session.discard(s["box_id"], s.get("product"))
+            raise
+        return new
+
+    async def finish(self, repo: ScanRepository, session: InventorySession, finished_at: str) -> Counter:
+        """Закрывает сессию и возвращает итог по продуктам из inventory_scans"""
+        await repo.finish_inventory_session(session.id, finished_at)
+        self._sessions.pop(session.id, None)
+        # Не session.counts: сканы этой сессии мог принять и другой воркер
+        scans = await repo.get_inventory_scans(session.id)
+        return Counter(scan.get("product") or UNKNOWN_PRODUCT for scan in scans)
+
+    def _remember(self, session: InventorySession) -> None:
+        self._sessions[session.id] = session
+        self._sessions.move_to_end(session.id)
+        while len(self._sessions) > self.max_sessions:
+            # Вытесненная сессия не теряется: при следующем обращении поднимется из БД
+            self._sessions.popitem(last=False)
+
+
+inventory_sessions = InventorySessions()
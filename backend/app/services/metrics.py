@@ -0,0 +1,261 @@
+# Лёгкие метрики в формате Prometheus (без внешних зависимостей).
+#
+# Счётчики и гистограммы живут в памяти процесса, значения меток передаются
+# позиционно в порядке labelnames. Всё, что делается на горячем пути, —
+# perf_counter, поиск корзины и инкремент под замком.
+#
+#   @timed("pdf.generate_base64")          # декоратор (обычные и async функции)
+#   with timed("sheets.load_snapshot"): ...  # контекстный менеджер
+#
+# Отдаётся эндпоинтом /metrics (см. main.py).
+import bisect
+import functools
+import inspect
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import httpx
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: List["_Metric"] = []
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _labels(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, value: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{self._labels(labels)} {_num(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = buckets
+        # Метки -> [счётчики по корзинам (последняя — +Inf), сумма, количество]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(labels, (list(e[0]), e[1], e[2])) for labels, e in self._values.items()]
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="%s"' % ("+Inf" if bound == float("inf") else _num(bound))
+                lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_num(total)}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {count}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+# --- Общие метрики приложения ---
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Время обработки запроса по эндпоинтам",
+    ("method", "route", "status"),
+)
+HTTP_ERRORS = Counter(
+    "http_request_errors_total", "Необработанные исключения в эндпоинтах", ("method", "route"),
+)
+DEP_LATENCY = Histogram(
+    "dependency_duration_seconds", "Время вызовов внешних сервисов (Supabase, Google, Telegram)",
+    ("dependency", "operation"),
+)
+DEP_ERRORS = Counter(
+    "dependency_errors_total", "Ошибки вызовов внешних сервисов", ("dependency", "operation"),
+)
+FUNC_LATENCY = Histogram(
+    "function_duration_seconds", "Время выполнения отмеченных функций", ("function",),
+)
+FUNC_ERRORS = Counter(
+    "function_errors_total", "Исключения в отмеченных функциях", ("function",),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Обращения к кэшам: hit / stale / miss", ("cache", "result"),
+)
+
+
+class timed:
+    """Замер времени и ошибок функции: декоратор или контекстный менеджер"""
+
+    __slots__ = ("name", "_start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        FUNC_LATENCY.observe(time.perf_counter() - self._start, self.name)
+        if exc_type is not None:
+            FUNC_ERRORS.inc(self.name)
+        return False
+
+    def __call__(self, func):
+        name = self.name
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class dependency_call:
+    """Замер одного вызова внешнего сервиса (контекстный менеджер)"""
+
+    __slots__ = ("dependency", "operation", "_start")
+
+    def __init__(self, dependency: str, operation: str):
+        self.dependency = dependency
+        self.operation = operation
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        DEP_LATENCY.observe(time.perf_counter() - self._start, self.dependency, self.operation)
+        if exc_type is not None:
+            DEP_ERRORS.inc(self.dependency, self.operation)
+        return False
+
+
+def cache_result(cache: str, result: str) -> None:
+    CACHE_REQUESTS.inc(cache, result)
+
+
+def cache_hit_ratios() -> List[str]:
+    """Доля попаданий по каждому кэшу (stale тоже считается попаданием — ответ без ожидания)"""
+    with CACHE_REQUESTS._lock:
+        items = list(CACHE_REQUESTS._values.items())
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in items:
+        entry = totals.setdefault(cache, [0, 0])
+        entry[1] += value
+        if result != "miss":
+            entry[0] += value
+    lines = ["# HELP cache_hit_ratio Доля обращений к кэшу без похода в источник",
+             "# TYPE cache_hit_ratio gauge"]
+    for cache, (hits, total) in totals.items():
+        lines.append(f'cache_hit_ratio{{cache="{_escape(cache)}"}} {_num(round(hits / total, 4))}')
+    return lines
+
+
+def register_collector(collector: Callable[[], Iterable[str]]) -> None:
+    """Функция, отдающая готовые строки метрик на момент запроса (например, размеры кэшей)"""
+    _collectors.append(collector)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.extend(cache_hit_ratios())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+# --- Замер запросов к Supabase (PostgREST) на уровне httpx ---
+
+_REST_PATH = re.compile(r"/rest/v1/(rpc/[^/?]+|[^/?]+)")
+
+
+def postgrest_operation(request: httpx.Request) -> str:
+    """'GET boxes', 'POST rpc/scan_box_production' — без id и фильтров, чтобы метки не плодились"""
+    match = _REST_PATH.search(request.url.path)
+    return f"{request.method} {match.group(1) if match else request.url.path}"
+
+
+class TimedAsyncTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, dependency: str):
+        self._inner = inner
+        self._dependency = dependency
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        with dependency_call(self._dependency, postgrest_operation(request)):
+            return await self._inner.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+class TimedTransport(httpx.BaseTransport):
+    def __init__(self, inner: httpx.BaseTransport, dependency: str):
+        self._inner = inner
+        self._dependency = dependency
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        with dependency_call(self._dependency, postgrest_operation(request)):
+            return self._inner.handle_request(request)
+
+    def close(self) -> None:
+        self._inner.close()
@@ -0,0 +1,259 @@
+# Локальная очередь исходящих действий (outbox) на SQLite.
+# Эндпоинты только записывают задание в файл БД — это доли миллисекунды,
+# а отправкой во внешние сервисы (Telegram) занимается фоновый поток:
+# с повторами, экспоненциальной задержкой и учётом лимитов сервиса.
+# Задания лежат на диске, поэтому переживают перезапуск приложения.
+# Файл может быть общим для нескольких воркеров uvicorn: перед отправкой
+# задание закрепляется за воркером (locked_until), и второй его не возьмёт.
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.services.storage import DATA_DIR
+
+logger = logging.getLogger("Outbox")
+
+OUTBOX_DB = os.getenv("OUTBOX_DB") or os.path.join(DATA_DIR, "outbox.sqlite3")
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_BACKOFF_BASE = 2.0     # Секунд до первого повтора, дальше удваивается
+OUTBOX_BACKOFF_MAX = 600.0    # Не ждём между попытками дольше 10 минут
+OUTBOX_POLL_INTERVAL = 5.0    # Как часто проверять отложенные задания без сигнала
+OUTBOX_FETCH_LIMIT = 50
+# На сколько задание закрепляется за воркером; если тот упал посреди
+# отправки, по истечении срока задание заберёт другой
+OUTBOX_LOCK_TIMEOUT = 300.0
+
+
+class RetryAfter(Exception):
+    """Сервис попросил подождать (например, Telegram 429 с retry_after)"""
+
+    def __init__(self, seconds: float, message: str = ""):
+        super().__init__(message or f"повторить через {seconds} с")
+        self.seconds = seconds
+
+
+class Outbox:
+    def __init__(self, path: str = OUTBOX_DB):
+        self.path = path
+        self._handlers: Dict[str, Callable[[dict], None]] = {}
+        self._batch_handlers: Dict[str, Callable[[List[dict]], None]] = {}
+        # Вид задания -> момент, раньше которого сервис просил не обращаться
+        self._paused_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+        # Файл БД открывается при первом обращении (обычно в start()),
+        # а не при импорте модуля
+        self._db: Optional[sqlite3.Connection] = None
+        self._open_lock = threading.Lock()
+
+    def register(self, kind: str, handler: Callable[[dict], None]) -> None:
+        """Обработчик задания: исключение — повтор позже, RetryAfter — повтор через указанное время"""
+        self._handlers[kind] = handler
+
+    def register_batch(self, kind: str, handler: Callable[[List[dict]], None]) -> None:
+        """Обработчик, получающий сразу все подошедшие задания вида kind (для сводок)"""
+        self._batch_handlers[kind] = handler
+
+    def enqueue(self, kind: str, payload: dict, delay: float = 0) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._conn().execute(
+                "INSERT INTO outbox (kind, payload, available_at, created_at) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(payload, ensure_ascii=False), now + delay, now),
+            )
+        # Будим диспетчер и для отложенных: он пересчитает, когда проснуться
+        self._wakeup.set()
+        return cur.lastrowid
+
+    def start(self) -> None:
+        self._conn()
+        if self._thread is None:
+            self._stopped = False
+            self._thread = threading.Thread(target=self._loop, name="outbox", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 5) -> None:
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending, dead = self._conn().execute(
+                "SELECT COALESCE(SUM(dead = 0), 0), COALESCE(SUM(dead = 1), 0) FROM outbox"
+            ).fetchone()
+        return {"pending": pending, "dead": dead}
+
+    def dispatch_due(self) -> int:
+        """Выполняет все задания, срок которых подошёл; возвращает число обработанных"""
+        now = time.time()
+        db = self._conn()
+        with self._lock:
+            due = db.execute(
+                "SELECT id, kind, payload, attempts FROM outbox "
+                "WHERE dead = 0 AND available_at <= ? AND locked_until <= ? "
+                "ORDER BY available_at, id LIMIT ?",
+                (now, now, OUTBOX_FETCH_LIMIT),
+            ).fetchall()
+            # Забираем задания по одному атомарным UPDATE: другой воркер мог
+            # выбрать те же строки, но отправит только тот, чей UPDATE сработал
+            rows = [
+                row for row in due
+                if db.execute(
+                    "UPDATE outbox SET locked_until = ? "
+                    "WHERE id = ? AND dead = 0 AND available_at <= ? AND locked_until <= ?",
+                    (now + OUTBOX_LOCK_TIMEOUT, row[0], now, now),
+                ).rowcount == 1
+            ]
+
+        batches: Dict[str, List[tuple]] = {}
+        for n, row in enumerate(rows):
+            if self._stopped:
+                self._release(rows[n:])
+                break
+            job_id, kind, payload, attempts = row
+            if kind in self._batch_handlers:
+                batches.setdefault(kind, []).append(row)
+                continue
+            handler = self._handlers.get(kind)
+            if handler is None:
+                self._fail([row], f"нет обработчика для '{kind}'")
+                continue
+            self._run(kind, [row], lambda: handler(json.loads(payload)))
+
+        for kind, group in batches.items():
+            if self._stopped:
+                self._release(group)
+                continue
+            handler = self._batch_handlers[kind]
+            self._run(kind, group, lambda: handler([json.loads(r[2]) for r in group]))
+        return len(rows)
+
+    # --- Внутреннее ---
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            with self._open_lock:
+                if self._db is None:
+                    self._db = self._open()
+        return self._db
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        # WAL + synchronous=NORMAL: запись не ждёт fsync на каждом коммите,
+        # но после сбоя процесса БД остаётся целой
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_error TEXT,
+                dead INTEGER NOT NULL DEFAULT 0,
+                locked_until REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        # Файл от версии без закрепления заданий
+        columns = {row[1] for row in db.execute("PRAGMA table_info(outbox)")}
+        if "locked_until" not in columns:
+            db.execute("ALTER TABLE outbox ADD COLUMN locked_until REAL NOT NULL DEFAULT 0")
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS outbox_due_idx ON outbox (dead, available_at)"
+        )
+        return db
+
+    def _run(self, kind: str, rows: List[tuple], call: Callable[[], None]) -> None:
+        """Выполняет обработчик для одного задания или группы и записывает итог"""
+        paused_until = self._paused_until.get(kind, 0)
+        if paused_until > time.time():
+            for job_id, _, _, attempts in rows:
+                self._reschedule(job_id, attempts, paused_until, "ожидание лимита сервиса")
+            return
+        try:
+            call()
+        except RetryAfter as e:
+            # Лимит сервиса: ставим на паузу весь вид заданий, попытку не засчитываем
+            until = time.time() + e.seconds
+            self._paused_until[kind] = until
+            for job_id, _, _, attempts in rows:
+                self._reschedule(job_id, attempts, until, str(e))
+        except Exception as e:
+            self._fail(rows, str(e))
+        else:
+            with self._lock:
+                self._conn().executemany("DELETE FROM outbox WHERE id = ?", [(r[0],) for r in rows])
+
+    def _fail(self, rows: List[tuple], error: str) -> None:
+        for job_id, _, _, attempts in rows:
+            attempts += 1
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                logger.error("❌ OUTBOX: задание %s не выполнено за %s попыток: %s", job_id, attempts, error)
+                with self._lock:
+                    self._conn().execute(
+                        "UPDATE outbox SET dead = 1, attempts = ?, last_error = ?, locked_until = 0 WHERE id = ?",
+                        (attempts, error, job_id),
+                    )
+                continue
+            delay = min(OUTBOX_BACKOFF_BASE * 2 ** max(attempts - 1, 0), OUTBOX_BACKOFF_MAX)
+            # Небольшой разброс, чтобы повторы после сбоя сети не шли одной пачкой
+            delay *= random.uniform(0.8, 1.2)
+            logger.warning(
+                "⚠️ OUTBOX: задание %s, попытка %s: %s; повтор через %.0f с", job_id, attempts, error, delay
+            )
+            self._reschedule(job_id, attempts, time.time() + delay, error)
+
+    def _reschedule(self, job_id: int, attempts: int, available_at: float, error: str) -> None:
+        with self._lock:
+            self._conn().execute(
+                "UPDATE outbox SET attempts = ?, available_at = ?, last_error = ?, locked_until = 0 "
+                "WHERE id = ?",
+                (attempts, available_at, error, job_id),
+            )
+
+    def _release(self, rows: List[tuple]) -> None:
+        """Снимает закрепление с заданий, которые не успели выполнить (остановка)"""
+        with self._lock:
+            self._conn().executemany(
+                "UPDATE outbox SET locked_until = 0 WHERE id = ?", [(r[0],) for r in rows]
+            )
+
+    def _next_due_in(self) -> float:
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT MIN(MAX(available_at, locked_until)) FROM outbox WHERE dead = 0"
+            ).fetchone()
+        if row[0] is None:
+            return OUTBOX_POLL_INTERVAL
+        return min(max(row[0] - time.time(), 0.0), OUTBOX_POLL_INTERVAL)
+
+    def _loop(self) -> None:
+        while not self._stopped:
+            try:
+                self.dispatch_due()
+                wait = self._next_due_in()
+            except Exception as e:
+                logger.exception("❌ OUTBOX: ошибка диспетчера: %s", e)
+                wait = OUTBOX_POLL_INTERVAL
+            if wait > 0:
+                self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+
+outbox = Outbox()
@@ -1,118 +1,298 @@
-import os
-import io
-import base64
-from reportlab.pdfgen import canvas
-from reportlab.graphics.shapes import Drawing
-from reportlab.graphics.barcode.qr import QrCodeWidget
-from reportlab.graphics import renderPDF
-from reportlab.lib.units import mm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
-# Путь к шрифтам. Поднимаемся на 3 уровня вверх от этого файла
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-FONTS_DIR = os.path.join(BASE_DIR, "fonts")
-
-FONT_REGULAR_NAME = "DejaVu"
-FONT_BOLD_NAME = "DejaVu-Bold"
-
-def register_fonts():
-    """Регистрация шрифтов"""
-    try:
-        regular_path = os.path.join(FONTS_DIR, "DejaVuSans.ttf")
-        bold_path = os.path.join(FONTS_DIR, "DejaVuSans-Bold.ttf")
-
-        if os.path.exists(regular_path):
-            pdfmetrics.registerFont(TTFont(FONT_REGULAR_NAME, regular_path))
-        else:
-            print(f"⚠️ Шрифт не найден: {regular_path}")
-            
-        if os.path.exists(bold_path):
-            pdfmetrics.registerFont(TTFont(FONT_BOLD_NAME, bold_path))
-    except Exception as e:
-        print(f"Ошибка шрифтов: {e}")
-
-# Регистрируем при импорте
-register_fonts()
-
-def generate_pdf_base64(boxes_data: list, label_info: dict) -> str:
-    """Генерация PDF (код перенесен из старого проекта)"""
-    buffer = io.BytesIO()
-    w, h = 120 * mm, 75 * mm
-    c = canvas.Canvas(buffer, pagesize=(w, h))
-
-    registered = pdfmetrics.getRegisteredFontNames()
-    base_font = FONT_BOLD_NAME if FONT_BOLD_NAME in registered else "Helvetica-Bold"
-
-    qr_size = 35 * mm
-    text_left = 60 * mm
-    text_right = w - 5 * mm
-    max_text_width = text_right - text_left
-
-    def fit_font_size(text: str, font_name: str, max_width: float, base_size: int, min_size: int = 8) -> int:
-        size = base_size
-        while size > min_size:
-            width = pdfmetrics.stringWidth(text, font_name, size)
-            if width <= max_width: return size
-            size -= 1
-        return min_size
-
-    for idx, box in enumerate(boxes_data, start=1):
-        box_id = box["id"]
-        
-        # Бренд
-        brand = label_info["brand"]
-        # Если бренд пустой, ставим заглушку, чтобы не падало
-        if not brand: brand = "Бренд"
-            
-        brand_max_width = w - 10 * mm
-        brand_size = fit_font_size(brand, base_font, brand_max_width, base_size=32, min_size=14)
-        c.setFont(base_font, brand_size)
-        x_brand = (w - pdfmetrics.stringWidth(brand, base_font, brand_size)) / 2
-        y_brand = h - 12 * mm
-        c.drawString(x_brand, y_brand, brand)
-
-        # QR
-        qr_widget = QrCodeWidget(box_id)
-        bounds = qr_widget.getBounds()
-        qr_w = bounds[2] - bounds[0]
-        qr_h = bounds[3] - bounds[1]
-        sx = qr_size / qr_w
-        sy = qr_size / qr_h
-        d = Drawing(qr_size, qr_size, transform=[sx, 0, 0, sy, 0, 0])
-        d.add(qr_widget)
-        renderPDF.draw(d, c, 8 * mm, (h - qr_size) / 2 - 5 * mm)
-
-        # Текст
-        t_type = label_info.get("type", "") or ""
-        t_cat = label_info.get("category", "") or ""
-        type_cat = f"{t_type} {t_cat}".strip().upper()
-        
-        recipe = label_info.get("recipe", "") or ""
-        items = label_info.get("items_per_box", 0)
-        date_str = label_info.get("date", "")
-        time_str = label_info.get("time", "")
-
-        lines = [
-            (type_cat, fit_font_size(type_cat, base_font, max_text_width, 18, 12)),
-            (recipe, 13),
-            (f"Коробка № {idx}", 13),
-            (f"Коробка: {items} шт", 12),
-            (f"Изг: {date_str} {time_str}", 14)
-        ]
-
-        line_step = 7 * mm
-        total_span = (len(lines) - 1) * line_step
-        y = h / 2 + total_span / 2 - 5 * mm
-
-        for txt, fsize in lines:
-            c.setFont(base_font, fsize)
-            width = pdfmetrics.stringWidth(txt, base_font, fsize)
-            x = text_left + (max_text_width - width) / 2
-            c.drawString(x, y, txt)
-            y -= line_step
-
-        c.showPage()
-
-    c.save()
-    return base64.b64encode(buffer.getvalue()).decode("utf-8")
\ No newline at end of file
+import os
+import io
+import logging
+import base64
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Sized, Tuple, Union
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from app.services.pdf_stream import PdfStreamWriter
+from app.services.qr import draw_qr
+from app.services.metrics import timed
+
+logger = logging.getLogger("PdfService")
+
+# Путь к шрифтам. Поднимаемся на 3 уровня вверх от этого файла
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FONTS_DIR = os.path.join(BASE_DIR, "fonts")
+
+FONT_REGULAR_NAME = "DejaVu"
+FONT_BOLD_NAME = "DejaVu-Bold"
+
+# Сколько этикеток рендерить за раз в потоковом режиме
+PDF_CHUNK_SIZE = int(os.getenv("PDF_CHUNK_SIZE", "100"))
+# Процессы для рендера больших заданий (1 — рендер в текущем процессе)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+# С какого размера задания имеет смысл делить его между процессами
+PDF_PARALLEL_MIN = int(os.getenv("PDF_PARALLEL_MIN", "300"))
+
+
+def pdf_workers(count: Optional[int]) -> int:
+    """Сколько процессов брать на задание из count этикеток.
+
+    Маленькие задания и задания неизвестного размера рендерятся в текущем
+    процессе: запуск spawn-пула стоит дороже, чем сам рендер.
+    """
+    if count is None or count < PDF_PARALLEL_MIN:
+        return 1
+    return PDF_WORKERS
+
+
+def register_fonts():
+    """Регистрация шрифтов"""
+    try:
+        regular_path = os.path.join(FONTS_DIR, "DejaVuSans.ttf")
+        bold_path = os.path.join(FONTS_DIR, "DejaVuSans-Bold.ttf")
+
+        if os.path.exists(regular_path):
+            pdfmetrics.registerFont(TTFont(FONT_REGULAR_NAME, regular_path))
+        else:
+            logger.warning("⚠️ Шрифт не найден: %s", regular_path)
+            
+        if os.path.exists(bold_path):
+            pdfmetrics.registerFont(TTFont(FONT_BOLD_NAME, bold_path))
+    except Exception as e:
+        logger.error("Ошибка шрифтов: %s", e)
+
+# Регистрируем при импорте
+register_fonts()
+
+LABEL_W, LABEL_H = 120 * mm, 75 * mm
+# Меняется при любой правке внешнего вида этикетки: входит в ключи кэша
+# отрендеренных страниц, чтобы перепечатка не отдала старую вёрстку
+LABEL_RENDER_VERSION = 2
+QR_SIZE = 35 * mm
+QR_X = 8 * mm
+QR_Y = (LABEL_H - QR_SIZE) / 2 - 5 * mm
+
+
+def fit_font_size(text: str, font_name: str, max_width: float, base_size: int, min_size: int = 8) -> int:
+    size = base_size
+    while size > min_size:
+        width = pdfmetrics.stringWidth(text, font_name, size)
+        if width <= max_width: return size
+        size -= 1
+    return min_size
+
+
+class LabelTemplate:
+    """Разметка этикетки, посчитанная один раз на задание печати.
+
+    Всё, кроме QR и номера коробки, одинаково для всех этикеток партии:
+    эта часть рисуется в PDF form XObject и на каждой странице вставляется
+    через doForm. На этикетку остаются только QR и строка с номером.
+    """
+
+    FORM_NAME = "label_static"
+
+    def __init__(self, label_info: dict):
+        w, h = LABEL_W, LABEL_H
+        registered = pdfmetrics.getRegisteredFontNames()
+        self.font = FONT_BOLD_NAME if FONT_BOLD_NAME in registered else "Helvetica-Bold"
+
+        text_left = 60 * mm
+        text_right = w - 5 * mm
+        max_text_width = text_right - text_left
+
+        # Бренд
+        brand = label_info["brand"]
+        # Если бренд пустой, ставим заглушку, чтобы не падало
+        if not brand: brand = "Бренд"
+        brand_size = fit_font_size(brand, self.font, w - 10 * mm, base_size=32, min_size=14)
+        self.brand = (brand, brand_size, (w - pdfmetrics.stringWidth(brand, self.font, brand_size)) / 2, h - 12 * mm)
+
+        # Текст
+        t_type = label_info.get("type", "") or ""
+        t_cat = label_info.get("category", "") or ""
+        type_cat = f"{t_type} {t_cat}".strip().upper()
+
+        recipe = label_info.get("recipe", "") or ""
+        items = label_info.get("items_per_box", 0)
+        date_str = label_info.get("date", "")
+        time_str = label_info.get("time", "")
+
+        lines = [
+            (type_cat, fit_font_size(type_cat, self.font, max_text_width, 18, 12)),
+            (recipe, 13),
+            (None, 13),  # Коробка № N — единственная строка, которая меняется
+            (f"Коробка: {items} шт", 12),
+            (f"Изг: {date_str} {time_str}", 14)
+        ]
+
+        line_step = 7 * mm
+        total_span = (len(lines) - 1) * line_step
+        y = h / 2 + total_span / 2 - 5 * mm
+
+        self.static_lines = []
+        for txt, fsize in lines:
+            if txt is None:
+                self.number_size = fsize
+                self.number_y = y
+            else:
+                width = pdfmetrics.stringWidth(txt, self.font, fsize)
+                self.static_lines.append((txt, fsize, text_left + (max_text_width - width) / 2, y))
+            y -= line_step
+
+        self._text_left = text_left
+        self._max_text_width = max_text_width
+
+    def define(self, c: canvas.Canvas) -> None:
+        """Записывает статичную часть в форму (один раз на документ)"""
+        c.beginForm(self.FORM_NAME)
+        brand, size, x, y = self.brand
+        c.setFont(self.font, size)
+        c.drawString(x, y, brand)
+        for txt, fsize, x, y in self.static_lines:
+            c.setFont(self.font, fsize)
+            c.drawString(x, y, txt)
+        c.endForm()
+
+    def draw(self, c: canvas.Canvas, box_id: str, box_no) -> None:
+        c.doForm(self.FORM_NAME)
+
+        # QR — одним путём прямо на холст (см. services/qr.py)
+        draw_qr(c, box_id, QR_X, QR_Y, QR_SIZE)
+
+        txt = f"Коробка № {box_no}"
+        c.setFont(self.font, self.number_size)
+        width = pdfmetrics.stringWidth(txt, self.font, self.number_size)
+        c.drawString(self._text_left + (self._max_text_width - width) / 2, self.number_y, txt)
+
+
+@timed("pdf.generate_base64")
+def generate_pdf_base64(boxes_data: list, label_info: dict) -> str:
+    """PDF всех этикеток одним base64 (для ответа /api/print)"""
+    pdf = b"".join(iter_labels_pdf(boxes_data, label_info))
+    return base64.b64encode(pdf).decode("utf-8")
+
+
+def iter_labels_pdf(
+    boxes: Iterable[dict],
+    label_info: dict,
+    chunk_size: int = PDF_CHUNK_SIZE,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[int], None]] = None,
+    count: Optional[int] = None,
+) -> Iterator[bytes]:
+    """Тот же PDF, но по кускам: в памяти не больше нескольких кусков этикеток.
+
+    boxes может быть генератором — коробки подтягиваются по мере рендера,
+    а ожидаемое число этикеток тогда передаётся в count.
+    При workers > 1 куски рендерятся параллельно в пуле процессов,
+    а склеиваются всё равно строго по порядку. По умолчанию workers
+    выбирает pdf_workers() по размеру задания.
+    progress(n) вызывается после каждого куска с числом готовых этикеток.
+    """
+    template = LabelTemplate(label_info)
+    if workers is None:
+        workers = pdf_workers(len(boxes) if isinstance(boxes, Sized) else count)
+    chunks = _iter_chunks(boxes, chunk_size)
+    if workers > 1:
+        rendered = _render_parallel(chunks, template, workers)
+    else:
+        rendered = (_render_timed(chunk, template, start_no) for start_no, chunk in chunks)
+
+    writer = PdfStreamWriter()
+    yield writer.start()
+    for pdf in rendered:
+        yield writer.add(pdf)
+        if progress:
+            progress(writer.page_count)
+    yield writer.finish()
+
+
+def _iter_chunks(boxes: Iterable[dict], chunk_size: int) -> Iterator[Tuple[int, list]]:
+    chunk = []
+    number = 1
+    for box in boxes:
+        chunk.append(box)
+        if len(chunk) >= chunk_size:
+            yield number, chunk
+            number += len(chunk)
+            chunk = []
+    if chunk:
+        yield number, chunk
+
+
+# --- Параллельный рендер ---
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn, а не fork: форк процесса с потоками uvicorn небезопасен
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=register_fonts,
+            )
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool(wait: bool = False) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait, cancel_futures=True)
+            _pool = None
+
+
+def _render_parallel(chunks: Iterator[Tuple[int, list]], template: "LabelTemplate", workers: int) -> Iterator[bytes]:
+    """Рендерит куски в пуле, отдаёт результаты по порядку.
+
+    В работе не больше 2 * workers кусков, чтобы память не росла
+    с размером партии, даже если склейка отстаёт.
+    """
+    pool = get_pool(workers)
+    pending = deque()
+    for start_no, chunk in chunks:
+        pending.append(pool.submit(render_labels_pdf, chunk, template, start_no))
+        if len(pending) >= 2 * workers:
+            yield _result_timed(pending.popleft())
+    while pending:
+        yield _result_timed(pending.popleft())
+
+
+# Рендер меряем в этом процессе: метрики воркеров пула в /metrics не попадают.
+# С пулом это время ожидания готового куска, без пула — сам рендер.
+def _render_timed(chunk: list, template: "LabelTemplate", start_no: int) -> bytes:
+    with timed("pdf.render_chunk"):
+        return render_labels_pdf(chunk, template, start_no)
+
+
+def _result_timed(future) -> bytes:
+    with timed("pdf.render_chunk"):
+        return future.result()
+
+
+def render_labels_pdf(boxes_data: list, label_info: Union[dict, LabelTemplate], start_no: int = 1) -> bytes:
+    """Генерация PDF (код перенесен из старого проекта).
+
+    label_info — словарь с данными этикетки или уже готовый LabelTemplate.
+    Номер коробки берётся из box_no, если он есть, иначе считается от start_no.
+    """
+    template = label_info if isinstance(label_info, LabelTemplate) else LabelTemplate(label_info)
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(LABEL_W, LABEL_H))
+    template.define(c)
+
+    for idx, box in enumerate(boxes_data, start=start_no):
+        template.draw(c, box["id"], box.get("box_no") or idx)
+        c.showPage()
+
+    c.save()
+    return buffer.getvalue()
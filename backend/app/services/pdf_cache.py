@@ -0,0 +1,134 @@
+# Дисковый кэш готовых PDF с ограничением по размеру (LRU по времени доступа).
+# Перепечатка того же задания отдаётся файлом, без повторного рендера.
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Iterable, Iterator, Optional
+
+from app.services.metrics import cache_result
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "sauce_control_pdf")
+PDF_CACHE_MAX_MB = int(os.getenv("PDF_CACHE_MAX_MB", "500"))
+# Размер кэша ведётся в памяти; каталог обходится, только когда лимит превышен
+# или с прошлого обхода прошло столько секунд (файлы пишут и другие воркеры)
+PDF_CACHE_RESCAN = float(os.getenv("PDF_CACHE_RESCAN", "60"))
+# Вытесняем с запасом, до этой доли лимита: иначе у полного кэша обход шёл бы на каждой записи
+PDF_CACHE_EVICT_TO = 0.9
+
+_SAFE_KEY = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class PdfDiskCache:
+    def __init__(self, directory: str = PDF_CACHE_DIR, max_bytes: int = PDF_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Байт в кэше по последнему обходу плюс записанное после него (None — не считали)
+        self._size: Optional[int] = None
+        self._scanned_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self.clear_stale_parts()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, _SAFE_KEY.sub("_", key) + ".pdf")
+
+    def get(self, key: str) -> Optional[str]:
+        """Путь к файлу, если он есть в кэше (и отметка об использовании)"""
+        path = self.path(key)
+        try:
+            os.utime(path)  # mtime = время последнего обращения, по нему вытесняем
+        except FileNotFoundError:
+            cache_result("pdf", "miss")
+            return None
+        cache_result("pdf", "hit")
+        return path
+
+    def put(self, key: str, chunks: Iterable[bytes]) -> str:
+        """Записывает PDF целиком и возвращает путь к файлу"""
+        for _ in self.stream_to(key, chunks):
+            pass
+        return self.path(key)
+
+    def stream_to(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Пропускает куски PDF дальше, параллельно сохраняя их в кэш.
+
+        Файл появляется в кэше только если документ дописан до конца:
+        при обрыве (например, клиент закрыл соединение) временный файл удаляется.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        path = self.path(key)
+        completed = False
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+                size = f.tell()
+            try:
+                size -= os.path.getsize(path)  # Файл с тем же ключом заменяется
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+            completed = True
+        finally:
+            if not completed:
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+        self._added(size)
+
+    def _added(self, size: int) -> None:
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+            due = (
+                self._size is None
+                or self._size > self.max_bytes
+                or time.monotonic() - self._scanned_at > PDF_CACHE_RESCAN
+            )
+        if due:
+            self.evict()
+
+    def evict(self) -> None:
+        """Если кэш больше лимита, удаляет самые давно использованные файлы до PDF_CACHE_EVICT_TO лимита"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".pdf"):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+
+            entries.sort()
+            target = self.max_bytes * PDF_CACHE_EVICT_TO if total > self.max_bytes else total
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+            self._size = total
+            self._scanned_at = time.monotonic()
+
+    def clear_stale_parts(self, older_than: float = 3600) -> None:
+        """Убирает недописанные .part после аварийного перезапуска"""
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".part") and now - entry.stat().st_mtime > older_than:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+pdf_cache = PdfDiskCache()
@@ -0,0 +1,146 @@
+# Потоковая склейка PDF.
+# ReportLab держит весь документ в памяти до save(), поэтому большие партии
+# рендерим кусками по N этикеток, а здесь переписываем страницы каждого
+# куска в один общий PDF и сразу отдаём готовые байты наружу.
+# Одинаковые объекты (шрифты, шаблоны этикетки) из разных кусков
+# записываются один раз — по хэшу содержимого.
+import hashlib
+import io
+from typing import Dict, List, Optional
+from pypdf import PdfReader
+from pypdf.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    PdfObject,
+    StreamObject,
+)
+
+CATALOG_ID = 1
+PAGES_ID = 2
+
+
+class PdfStreamWriter:
+    """Собирает один PDF из нескольких, отдавая байты по мере готовности.
+
+    Использование: start(), затем add(pdf_bytes) для каждого куска по порядку,
+    в конце finish(). Каждый вызов возвращает очередную порцию файла.
+    В памяти остаются только смещения объектов и id страниц.
+    """
+
+    def __init__(self):
+        self._pos = 0
+        self._next_id = PAGES_ID + 1
+        self._offsets: Dict[int, int] = {}
+        self._page_ids: List[int] = []
+        self._by_hash: Dict[bytes, int] = {}
+        self._out: List[bytes] = []
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_ids)
+
+    def start(self) -> bytes:
+        self._write(b"%PDF-1.4\n%\x93\x8c\x8b\x9e\n")
+        return self._flush()
+
+    def add(self, pdf_bytes: bytes) -> bytes:
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        ref_map: Dict[int, int] = {}
+        for page in reader.pages:
+            page_id = self._alloc()
+            body = DictionaryObject()
+            for key, value in page.items():
+                if key == "/Parent":
+                    continue
+                body[NameObject(key)] = self._clone(value, ref_map, set())
+            body[NameObject("/Parent")] = IndirectObject(PAGES_ID, 0, None)
+            self._emit(page_id, _serialize(body))
+            self._page_ids.append(page_id)
+        return self._flush()
+
+    def finish(self) -> bytes:
+        kids = " ".join(f"{pid} 0 R" for pid in self._page_ids)
+        self._emit(
+            PAGES_ID,
+            f"<< /Type /Pages /Kids [ {kids} ] /Count {len(self._page_ids)} >>".encode(),
+        )
+        self._emit(CATALOG_ID, f"<< /Type /Catalog /Pages {PAGES_ID} 0 R >>".encode())
+
+        size = self._next_id
+        xref_pos = self._pos
+        lines = [f"xref\n0 {size}\n".encode(), b"0000000000 65535 f \n"]
+        for obj_id in range(1, size):
+            lines.append(b"%010d 00000 n \n" % self._offsets[obj_id])
+        lines.append(
+            f"trailer\n<< /Size {size} /Root {CATALOG_ID} 0 R >>\n"
+            f"startxref\n{xref_pos}\n%%EOF\n".encode()
+        )
+        self._write(b"".join(lines))
+        return self._flush()
+
+    # --- Внутреннее ---
+
+    def _alloc(self) -> int:
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _write(self, data: bytes) -> None:
+        self._out.append(data)
+        self._pos += len(data)
+
+    def _flush(self) -> bytes:
+        data = b"".join(self._out)
+        self._out = []
+        return data
+
+    def _emit(self, obj_id: int, body: bytes) -> None:
+        self._offsets[obj_id] = self._pos
+        self._write(b"%d 0 obj\n" % obj_id + body + b"\nendobj\n")
+
+    def _copy_ref(self, ref: IndirectObject, ref_map: Dict[int, int], path: set) -> int:
+        if ref.idnum in ref_map:
+            return ref_map[ref.idnum]
+        if ref.idnum in path:
+            raise ValueError(f"Циклическая ссылка на объект {ref.idnum} в PDF куска")
+
+        path.add(ref.idnum)
+        body = _serialize(self._clone(ref.get_object(), ref_map, path))
+        path.discard(ref.idnum)
+
+        digest = hashlib.sha1(body).digest()
+        obj_id: Optional[int] = self._by_hash.get(digest)
+        if obj_id is None:
+            obj_id = self._alloc()
+            self._emit(obj_id, body)
+            self._by_hash[digest] = obj_id
+        ref_map[ref.idnum] = obj_id
+        return obj_id
+
+    def _clone(self, obj: PdfObject, ref_map: Dict[int, int], path: set) -> PdfObject:
+        if isinstance(obj, IndirectObject):
+            return IndirectObject(self._copy_ref(obj, ref_map, path), 0, None)
+        if isinstance(obj, StreamObject):
+            # Данные потока переносим как есть, вместе с /Filter — без пережатия
+            new = obj.__class__()
+            new._data = obj._data
+            for key, value in obj.items():
+                if key != "/Length":
+                    new[NameObject(key)] = self._clone(value, ref_map, path)
+            return new
+        if isinstance(obj, DictionaryObject):
+            new = DictionaryObject()
+            for key, value in obj.items():
+                new[NameObject(key)] = self._clone(value, ref_map, path)
+            return new
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._clone(v, ref_map, path) for v in obj)
+        return obj
+
+
+def _serialize(obj: PdfObject) -> bytes:
+    buf = io.BytesIO()
+    obj.write_to_stream(buf)
+    return buf.getvalue()
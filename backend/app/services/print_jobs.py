@@ -0,0 +1,139 @@
+# Очередь заданий печати: рендер PDF в фоне, статус по id задания.
+# Готовые файлы складываются в дисковый кэш (pdf_cache), поэтому
+# повторный запрос того же задания не рендерит его заново.
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from app.services.pdf import iter_labels_pdf
+from app.services.pdf_cache import PdfDiskCache, pdf_cache
+from app.services.metrics import timed
+
+logger = logging.getLogger("PrintJobs")
+
+PRINT_JOB_WORKERS = int(os.getenv("PRINT_JOB_WORKERS", "2"))
+PRINT_QUEUE_MAX = int(os.getenv("PRINT_QUEUE_MAX", "20"))   # Заданий в очереди + в работе
+PRINT_JOBS_KEEP = 500                                       # Сколько последних заданий помнить
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class PrintJob:
+    def __init__(self, cache_key: str, total: int, filename: str, batch_id=None):
+        self.id = uuid.uuid4().hex
+        self.cache_key = cache_key
+        self.total = total
+        self.done = 0
+        self.filename = filename
+        self.batch_id = batch_id
+        self.status = "queued"  # queued / rendering / done / error
+        self.error: Optional[str] = None
+        self.path: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._event = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+    def finish(self, path: Optional[str] = None, error: Optional[str] = None) -> None:
+        self.path = path
+        self.error = error
+        self.status = "error" if error else "done"
+        if not error:
+            self.done = self.total
+        self.finished_at = time.time()
+        self._event.set()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "batch_id": self.batch_id,
+            "done": self.done,
+            "total": self.total,
+            "progress": round(self.done / self.total, 3) if self.total else 1.0,
+            "error": self.error,
+            "filename": self.filename,
+            "pdf_url": f"/api/print/jobs/{self.id}/pdf" if self.status == "done" else None,
+        }
+
+
+class PrintJobQueue:
+    def __init__(self, workers: int = PRINT_JOB_WORKERS, cache: PdfDiskCache = pdf_cache):
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="print-job")
+        self._jobs: "OrderedDict[str, PrintJob]" = OrderedDict()
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, cache_key: str, boxes: Iterable[dict], total: int, label_info: dict,
+               filename: str, batch_id=None) -> PrintJob:
+        """Ставит рендер в очередь; если такой PDF уже в кэше — задание сразу готово"""
+        job = PrintJob(cache_key, total, filename, batch_id)
+
+        cached = self.cache.get(cache_key)
+        with self._lock:
+            if cached is None and self._active >= PRINT_QUEUE_MAX:
+                raise QueueFullError("Очередь печати переполнена, попробуйте позже")
+            self._remember(job)
+            if cached is None:
+                self._active += 1
+
+        if cached is not None:
+            job.finish(path=cached)
+            return job
+        try:
+            self._executor.submit(self._run, job, boxes, label_info)
+        except Exception as e:
+            # Например, после shutdown: место в очереди освобождаем, задание — с ошибкой
+            with self._lock:
+                self._active -= 1
+            job.finish(error=str(e))
+            raise
+        return job
+
+    @property
+    def active(self) -> int:
+        """Заданий в очереди и в работе"""
+        return self._active
+
+    def get(self, job_id: str) -> Optional[PrintJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _remember(self, job: PrintJob) -> None:
+        self._jobs[job.id] = job
+        while len(self._jobs) > PRINT_JOBS_KEEP:
+            self._jobs.popitem(last=False)
+
+    @timed("print_jobs.render")
+    def _run(self, job: PrintJob, boxes: Iterable[dict], label_info: dict) -> None:
+        job.status = "rendering"
+        try:
+            def on_progress(done: int) -> None:
+                job.done = done
+
+            path = self.cache.put(job.cache_key, iter_labels_pdf(
+                boxes, label_info, progress=on_progress, count=job.total,
+            ))
+            job.finish(path=path)
+        except Exception as e:
+            logger.exception("❌ ОШИБКА ЗАДАНИЯ ПЕЧАТИ %s: %s", job.id, e)
+            job.finish(error=str(e))
+        finally:
+            with self._lock:
+                self._active -= 1
+
+
+print_jobs = PrintJobQueue()
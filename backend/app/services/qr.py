@@ -0,0 +1,82 @@
+# Быстрый QR для этикеток.
+#
+# QrCodeWidget на каждую этикетку собирает Drawing из Rect на каждый ряд
+# тёмных модулей, а renderPDF пишет для каждого свой блок q ... Q с цветом
+# и настройками линии — сотни операторов на один код. Здесь матрица берётся
+# прямо из qrencoder (того же, что внутри виджета), соседние тёмные модули
+# склеиваются в прямоугольники, и весь код рисуется одним путём с одной заливкой.
+#
+# Версия и уровень коррекции фиксированы: UUID коробки (36 символов) всегда
+# кодируется версией 3 с уровнем L — это же выбирал и виджет. Геометрия
+# прежняя: код с полем в QR_BORDER модулей вписан в квадрат заданного размера.
+from typing import List, Tuple
+
+from reportlab.graphics.barcode import qrencoder
+from reportlab.lib import colors
+from reportlab.pdfgen import canvas
+
+QR_VERSION = 3
+QR_LEVEL = qrencoder.QRErrorCorrectLevel.L
+# Сколько байт помещается в версию 3 с уровнем L
+QR_CAPACITY = 53
+QR_BORDER = 4
+
+
+def qr_matrix(value: str) -> List[List[bool]]:
+    """Матрица модулей (True — тёмный), строки сверху вниз"""
+    # Что-то длиннее UUID (ручной ввод, тестовые коды) — версию подберёт кодировщик
+    version = QR_VERSION if len(value.encode("utf-8")) <= QR_CAPACITY else None
+    qr = qrencoder.QRCode(version, QR_LEVEL)
+    qr.addData(value)
+    qr.make()
+    return qr.modules
+
+
+def merge_modules(modules: List[List[bool]]) -> List[Tuple[int, int, int, int]]:
+    """Тёмные модули -> прямоугольники (колонка, строка, ширина, высота) в модулях.
+
+    Подряд идущие тёмные модули строки склеиваются в отрезок, а одинаковые
+    отрезки соседних строк — в один прямоугольник. Прямоугольники не перекрываются.
+    """
+    rects: List[List[int]] = []
+    # (начало, длина) отрезка -> его прямоугольник, если он продолжается с прошлой строки
+    open_runs = {}
+    for row_no, row in enumerate(modules):
+        runs = {}
+        col = 0
+        width = len(row)
+        while col < width:
+            if not row[col]:
+                col += 1
+                continue
+            start = col
+            while col < width and row[col]:
+                col += 1
+            run = (start, col - start)
+            rect = open_runs.get(run)
+            if rect is not None:
+                rect[3] += 1
+            else:
+                rect = [start, row_no, col - start, 1]
+                rects.append(rect)
+            runs[run] = rect
+        open_runs = runs
+    return [tuple(rect) for rect in rects]
+
+
+def draw_qr(c: canvas.Canvas, value: str, x: float, y: float, size: float, border: int = QR_BORDER) -> None:
+    """QR-код в квадрате size×size с левым нижним углом (x, y)"""
+    modules = qr_matrix(value)
+    module = size / (len(modules) + 2 * border)
+    # Строки матрицы идут сверху вниз, а ось y в PDF — снизу вверх
+    top = y + size - border * module
+    left = x + border * module
+
+    path = c.beginPath()
+    for col, row, w, h in merge_modules(modules):
+        path.rect(left + col * module, top - (row + h) * module, w * module, h * module)
+
+    c.saveState()
+    c.setFillColor(colors.black)
+    c.drawPath(path, stroke=0, fill=1)
+    c.restoreState()
@@ -0,0 +1,95 @@
+# Перепечатка этикеток существующей партии.
+# Коробки режутся на куски, выровненные по номерам (1-100, 101-200, ...),
+# и каждый отрендеренный кусок кладётся в дисковый кэш под ключом-хэшем
+# от содержимого: версия вёрстки + данные этикетки + (номер, id) коробок.
+# Повторная перепечатка того же диапазона собирается из готовых файлов.
+import hashlib
+import json
+from collections import deque
+from typing import Iterable, Iterator, Optional, Tuple
+
+from app.services.pdf import (
+    LABEL_RENDER_VERSION,
+    PDF_CHUNK_SIZE,
+    LabelTemplate,
+    get_pool,
+    pdf_workers,
+    render_labels_pdf,
+)
+from app.services.metrics import timed
+from app.services.pdf_cache import PdfDiskCache, pdf_cache
+from app.services.pdf_stream import PdfStreamWriter
+
+
+def _aligned_chunks(boxes: Iterable[dict], chunk_size: int) -> Iterator[Tuple[int, list]]:
+    """Группирует коробки (по возрастанию box_no) в куски с общими границами"""
+    chunk, chunk_idx = [], None
+    for box in boxes:
+        idx = (box["box_no"] - 1) // chunk_size
+        if chunk and idx != chunk_idx:
+            yield chunk[0]["box_no"], chunk
+            chunk = []
+        chunk_idx = idx
+        chunk.append(box)
+    if chunk:
+        yield chunk[0]["box_no"], chunk
+
+
+def chunk_cache_key(template_key: bytes, chunk: list) -> str:
+    h = hashlib.sha256(template_key)
+    for box in chunk:
+        h.update(f"{box['box_no']}:{box['id']};".encode())
+    return "labels_" + h.hexdigest()
+
+
+def iter_reprint_pdf(
+    boxes: Iterable[dict],
+    label_info: dict,
+    cache: PdfDiskCache = pdf_cache,
+    chunk_size: int = PDF_CHUNK_SIZE,
+    workers: Optional[int] = None,
+    count: Optional[int] = None,
+) -> Iterator[bytes]:
+    """PDF этикеток по коробкам с box_no, потоком; готовые куски берутся из кэша.
+
+    count — ожидаемое число коробок: по нему pdf_workers() решает, нужен ли пул.
+    """
+    template = LabelTemplate(label_info)
+    template_key = json.dumps(
+        [LABEL_RENDER_VERSION, label_info], sort_keys=True, ensure_ascii=False
+    ).encode("utf-8")
+    workers = pdf_workers(count) if workers is None else workers
+    pool = get_pool(workers) if workers > 1 else None
+
+    def resolve(item) -> bytes:
+        key, future, pdf = item
+        if future is not None:
+            with timed("pdf.render_chunk"):
+                pdf = future.result()
+        if key is not None:
+            cache.put(key, [pdf])
+        return pdf
+
+    writer = PdfStreamWriter()
+    yield writer.start()
+
+    pending = deque()
+    for start_no, chunk in _aligned_chunks(boxes, chunk_size):
+        key = chunk_cache_key(template_key, chunk)
+        path = cache.get(key)
+        if path:
+            with open(path, "rb") as f:
+                pending.append((None, None, f.read()))
+        elif pool:
+            pending.append((key, pool.submit(render_labels_pdf, chunk, template, start_no), None))
+        else:
+            with timed("pdf.render_chunk"):
+                pdf = render_labels_pdf(chunk, template, start_no)
+            pending.append((key, None, pdf))
+
+        while len(pending) > 2 * max(workers, 1):
+            yield writer.add(resolve(pending.popleft()))
+
+    while pending:
+        yield writer.add(resolve(pending.popleft()))
+    yield writer.finish()
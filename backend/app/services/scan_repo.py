@@ -0,0 +1,140 @@
+# Асинхронный доступ к таблицам boxes / batches для сканирования
+import asyncio
+from typing import Dict, List, Optional
+from postgrest.types import ReturnMethod
+from supabase import AsyncClient
+from app.services.batch_cache import batch_cache
+
+# Сколько id отправлять в одном in_ (фильтр едет в URL, а он не резиновый)
+IN_CHUNK = 200
+PAGE_SIZE = 1000  # PostgREST по умолчанию отдаёт не больше 1000 строк
+
+
+class ScanRepository:
+    def __init__(self, db: AsyncClient):
+        self.db = db
+
+    async def get_box(self, box_id: str) -> Optional[dict]:
+        res = await self.db.table("boxes").select("*").eq("id", box_id).execute()
+        return res.data[0] if res.data else None
+
+    async def get_batch(self, batch_id, columns: str = "*") -> Optional[dict]:
+        res = await self.db.table("batches").select(columns).eq("id", batch_id).execute()
+        return res.data[0] if res.data else None
+
+    async def get_boxes(self, box_ids: List[str], columns: str = "*") -> Dict[str, dict]:
+        """Коробки по списку id (in_ пачками по IN_CHUNK), ключ — строковый id"""
+        chunks = [box_ids[i:i + IN_CHUNK] for i in range(0, len(box_ids), IN_CHUNK)]
+        results = await asyncio.gather(*(
+            self.db.table("boxes").select(columns).in_("id", chunk).execute()
+            for chunk in chunks
+        ))
+        return {str(row["id"]): row for res in results for row in res.data or []}
+
+    async def get_batches(self, batch_ids: list, columns: str = "*") -> Dict[str, dict]:
+        """Партии одним запросом in_, по строковому id (в columns нужен id)"""
+        if not batch_ids:
+            return {}
+        res = await self.db.table("batches").select(columns).in_("id", batch_ids).execute()
+        return {str(row["id"]): row for row in res.data or []}
+
+    async def get_batch_cached(self, batch_id) -> Optional[dict]:
+        """Строка партии через batch_cache (без изменчивых колонок вроде produced_count)"""
+        batch = batch_cache.get(batch_id)
+        if batch is None:
+            batch = await self.get_batch(batch_id, "*")
+            if batch:
+                batch_cache.put(batch_id, batch)
+        return batch
+
+    async def get_batches_cached(self, batch_ids: list) -> Dict[str, dict]:
+        """Как get_batches("*"), но из БД читаются только партии, которых нет в кэше"""
+        found, missing = batch_cache.get_many(batch_ids)
+        if missing:
+            loaded = await self.get_batches(missing, "*")
+            for batch_id, batch in loaded.items():
+                batch_cache.put(batch_id, batch)
+            found.update(loaded)
+        return found
+
+    async def update_box(self, box_id: str, data: dict) -> None:
+        await self.db.table("boxes").update(data).eq("id", box_id).execute()
+
+    async def update_boxes(self, box_ids: List[str], data: dict) -> None:
+        await asyncio.gather(*(
+            self.db.table("boxes").update(data).in_("id", box_ids[i:i + IN_CHUNK]).execute()
+            for i in range(0, len(box_ids), IN_CHUNK)
+        ))
+
+    async def scan_production(
+        self,
+        box_id: str,
+        scanned_at: str,
+        user_name: Optional[str],
+        machine_id: Optional[str],
+        coworkers: List[str],
+    ) -> str:
+        """Атомарная отметка фасовки одной RPC (см. supabase/migrations).
+
+        Возвращает ok / duplicate / unknown / plan_exceeded.
+        """
+        res = await self.db.rpc(
+            "scan_box_production",
+            {
+                "p_box_id": box_id,
+                "p_scanned_at": scanned_at,
+                "p_user_name": user_name,
+                "p_machine_id": machine_id,
+                "p_coworkers": coworkers,
+            },
+        ).execute()
+        return (res.data or {}).get("result", "unknown")
+
+    async def scan_production_bulk(self, items: List[dict]) -> List[str]:
+        """Пакетная фасовка одной RPC; items — строки в форме таблицы boxes.
+
+        Результаты в том же порядке, что и items.
+        """
+        if not items:
+            return []
+        res = await self.db.rpc("scan_boxes_production", {"p_items": items}).execute()
+        return [(r or {}).get("result", "unknown") for r in res.data or []]
+
+    # --- Сессии инвентаризации ---
+
+    async def create_inventory_session(self, user_name: Optional[str]) -> dict:
+        res = await self.db.table("inventory_sessions").insert({"user_name": user_name}).execute()
+        return res.data[0]
+
+    async def get_inventory_session(self, session_id: str) -> Optional[dict]:
+        res = await self.db.table("inventory_sessions").select("*").eq("id", session_id).execute()
+        return res.data[0] if res.data else None
+
+    async def add_inventory_scans(self, rows: List[dict]) -> None:
+        """Повторный скан той же коробки в сессии молча пропускается"""
+        if not rows:
+            return
+        await self.db.table("inventory_scans").upsert(
+            rows, on_conflict="session_id,box_id", ignore_duplicates=True,
+            returning=ReturnMethod.minimal,
+        ).execute()
+
+    async def get_inventory_scans(self, session_id: str) -> List[dict]:
+        """Все сканы сессии (box_id, product), постранично"""
+        rows: List[dict] = []
+        while True:
+            res = await (
+                self.db.table("inventory_scans").select("box_id,product")
+                .eq("session_id", session_id)
+                .order("box_id")
+                .range(len(rows), len(rows) + PAGE_SIZE - 1)
+                .execute()
+            )
+            rows.extend(res.data or [])
+            if len(res.data or []) < PAGE_SIZE:
+                return rows
+
+    async def finish_inventory_session(self, session_id: str, finished_at: str) -> None:
+        await self.db.table("inventory_sessions").update(
+            {"finished_at": finished_at}, returning=ReturnMethod.minimal
+        ).eq("id", session_id).execute()
@@ -1,75 +1,144 @@
-import os
-from datetime import datetime
-import pytz
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-
-CREDENTIALS_FILE = "service_account.json"
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-REPORTS_SPREADSHEET_ID = os.getenv("GOOGLE_SHEET_ID_REPORTS")
-TZ = pytz.timezone("Asia/Yekaterinburg")
-
-def get_service():
-    if not os.path.exists(CREDENTIALS_FILE):
-        return None
-    try:
-        creds = service_account.Credentials.from_service_account_file(
-            CREDENTIALS_FILE, scopes=SCOPES
-        )
-        return build("sheets", "v4", credentials=creds)
-    except:
-        return None
-
-def write_report(data: dict):
-    if not REPORTS_SPREADSHEET_ID:
-        print("GS LOG: Нет ID таблицы отчетов")
-        return
-
-    service = get_service()
-    if not service:
-        return
-
-    try:
-        now = datetime.now(TZ)
-        sheet_title = now.strftime("%d.%m.%Y")
-
-        spreadsheet = service.spreadsheets().get(spreadsheetId=REPORTS_SPREADSHEET_ID).execute()
-        sheets = spreadsheet.get('sheets', [])
-        sheet_id = None
-        
-        for s in sheets:
-            if s['properties']['title'] == sheet_title:
-                sheet_id = s['properties']['sheetId']
-                break
-        
-        if sheet_id is None:
-            req_body = { "requests": [{ "addSheet": { "properties": {"title": sheet_title} } }] }
-            service.spreadsheets().batchUpdate(spreadsheetId=REPORTS_SPREADSHEET_ID, body=req_body).execute()
-            headers = ["Время", "Бренд", "Тип", "Категория", "Рецепт", "Кол-во (факт)", "Партия №", "ID Партии"]
-            service.spreadsheets().values().append(
-                spreadsheetId=REPORTS_SPREADSHEET_ID,
-                range=f"'{sheet_title}'!A1",
-                valueInputOption="RAW",
-                body={"values": [headers]}
-            ).execute()
-
-        row = [
-            data.get("time_str", ""),
-            data.get("brand", ""),
-            data.get("type", ""),
-            data.get("category", ""),
-            data.get("recipe", ""),
-            data.get("count", 0),
-            data.get("batch_num", ""),
-            data.get("batch_id", "")
-        ]
-
-        service.spreadsheets().values().append(
-            spreadsheetId=REPORTS_SPREADSHEET_ID,
-            range=f"'{sheet_title}'!A1",
-            valueInputOption="RAW",
-            body={"values": [row]}
-        ).execute()
-        
-    except Exception as e:
-        print(f"GS WRITE ERROR: {e}")
\ No newline at end of file
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional
+import pytz
+from googleapiclient.errors import HttpError
+from app.services import google_client
+from app.services.metrics import timed
+from app.services.outbox import Outbox, RetryAfter, outbox
+
+logger = logging.getLogger("SheetsWriter")
+
+REPORTS_SPREADSHEET_ID = os.getenv("GOOGLE_SHEET_ID_REPORTS")
+TZ = pytz.timezone("Asia/Yekaterinburg")
+
+# Строки отчёта копятся в outbox — общем SQLite-файле всех воркеров — и уходят
+# в таблицу пачкой: все строки окна в REPORTS_FLUSH_INTERVAL секунд одним
+# append на лист. Outbox закрепляет задания за воркером, поэтому строку
+# отправит ровно один из них, а до отправки она переживает перезапуск.
+REPORTS_FLUSH_INTERVAL = float(os.getenv("REPORTS_FLUSH_INTERVAL", "10"))
+# Через сколько секунд повторить запись, если Google недоступен
+REPORTS_RETRY_AFTER = float(os.getenv("REPORTS_RETRY_AFTER", "30"))
+
+HEADERS = ["Время", "Бренд", "Тип", "Категория", "Рецепт", "Кол-во (факт)", "Партия №", "ID Партии"]
+
+# Виды заданий outbox: строка отчёта и пачка строк одного листа
+REPORT_ROW = "report_row"
+REPORT_APPEND = "report_append"
+
+
+def get_service():
+    # Общий клиент: без повторного чтения ключа и сборки discovery на каждый отчёт
+    return google_client.get_sheets()
+
+
+class ReportsWriter:
+    def __init__(self, spreadsheet_id: Optional[str] = REPORTS_SPREADSHEET_ID,
+                 queue: Outbox = outbox, interval: float = REPORTS_FLUSH_INTERVAL):
+        self.spreadsheet_id = spreadsheet_id
+        self.queue = queue
+        self.interval = interval
+        # Название листа -> sheetId; перечитываем, только если листа нет в кэше
+        self._sheet_ids: Optional[Dict[str, int]] = None
+        self._lock = threading.Lock()
+        queue.register_batch(REPORT_ROW, self._group_rows)
+        queue.register(REPORT_APPEND, self._append)
+
+    def add(self, data: dict) -> None:
+        """Ставит строку отчёта в outbox; в Google она уйдёт с ближайшей пачкой"""
+        if not self.spreadsheet_id:
+            logger.warning("GS LOG: Нет ID таблицы отчетов", extra={"sample": True})
+            return
+        # Лист выбираем по дате завершения, а не по дате отправки:
+        # строка, отправленная после полуночи, всё равно попадёт во вчерашний лист
+        now = time.time()
+        item = {"sheet": datetime.now(TZ).strftime("%d.%m.%Y"), "row": _report_row(data)}
+        # Окна выровнены по часам, как у сводок Telegram: строки всех воркеров
+        # за окно становятся готовыми одновременно и уходят одной пачкой
+        delay = self.interval - now % self.interval if self.interval > 0 else 0
+        self.queue.enqueue(REPORT_ROW, item, delay=delay)
+
+    # --- Обработчики outbox ---
+
+    def _group_rows(self, items: List[dict]) -> None:
+        # Каждый лист — отдельное задание: при сбое повторяется только он,
+        # а уже записанные листы не уходят в Google второй раз
+        by_sheet: Dict[str, List[list]] = {}
+        for item in items:
+            by_sheet.setdefault(item["sheet"], []).append(item["row"])
+        for title, rows in by_sheet.items():
+            self.queue.enqueue(REPORT_APPEND, {"sheet": title, "rows": rows})
+
+    @timed("reports.append")
+    def _append(self, payload: dict) -> None:
+        service = get_service()
+        if not service:
+            raise RetryAfter(REPORTS_RETRY_AFTER, "нет клиента Google Sheets")
+        title = payload["sheet"]
+        try:
+            self._ensure_sheet(service, title)
+            service.spreadsheets().values().append(
+                spreadsheetId=self.spreadsheet_id,
+                range=f"'{title}'!A1",
+                valueInputOption="RAW",
+                body={"values": payload["rows"]}
+            ).execute()
+        except Exception as e:
+            # Лист могли удалить или переименовать — в следующий раз перечитаем список
+            self._sheet_ids = None
+            logger.error("GS WRITE ERROR: %s", e)
+            if isinstance(e, HttpError) and 400 <= e.resp.status < 500 and e.resp.status != 429:
+                # Ошибка в самом запросе: обычный повтор с растущей задержкой
+                raise
+            # Google недоступен или просит подождать — ждём, попытку не засчитываем
+            raise RetryAfter(REPORTS_RETRY_AFTER, str(e))
+
+    def _ensure_sheet(self, service, title: str) -> None:
+        """Создаёт лист вместе со строкой заголовков, если его ещё нет"""
+        with self._lock:
+            if self._sheet_ids is not None and title in self._sheet_ids:
+                return
+            meta = service.spreadsheets().get(
+                spreadsheetId=self.spreadsheet_id, fields="sheets.properties(sheetId,title)"
+            ).execute()
+            self._sheet_ids = {
+                s["properties"]["title"]: s["properties"]["sheetId"] for s in meta.get("sheets", [])
+            }
+            if title in self._sheet_ids:
+                return
+
+            # Лист и заголовки — одним batchUpdate: лист без заголовков не останется,
+            # даже если запись строк потом не удастся. sheetId задаём сами, чтобы
+            # сослаться на него в том же запросе
+            sheet_id = zlib.crc32(title.encode("utf-8")) & 0x7FFFFFFF
+            header = {"values": [{"userEnteredValue": {"stringValue": h}} for h in HEADERS]}
+            req_body = {"requests": [
+                {"addSheet": {"properties": {"sheetId": sheet_id, "title": title}}},
+                {"appendCells": {"sheetId": sheet_id, "rows": [header], "fields": "userEnteredValue"}},
+            ]}
+            service.spreadsheets().batchUpdate(spreadsheetId=self.spreadsheet_id, body=req_body).execute()
+            self._sheet_ids[title] = sheet_id
+
+
+def _report_row(data: dict) -> list:
+    return [
+        data.get("time_str", ""),
+        data.get("brand", ""),
+        data.get("type", ""),
+        data.get("category", ""),
+        data.get("recipe", ""),
+        data.get("count", 0),
+        data.get("batch_num", ""),
+        data.get("batch_id", "")
+    ]
+
+
+reports_writer = ReportsWriter()
+
+
+def write_report(data: dict):
+    reports_writer.add(data)
@@ -0,0 +1,7 @@
+# Каталог для файлов, которые должны пережить перезапуск приложения
+# (outbox уведомлений и строк отчёта). По умолчанию backend/data — он в .gitignore;
+# на сервере DATA_DIR указывает на постоянный том.
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = os.getenv("DATA_DIR") or os.path.join(BASE_DIR, "data")
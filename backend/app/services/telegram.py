@@ -1,23 +1,190 @@
-import os
-import requests
-import logging
-
-logger = logging.getLogger("Telegram")
-
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-
-def send_message(text: str) -> bool:
-    if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
-        logger.warning("TELEGRAM: нет токена или ID чата")
-        return False
-
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {"chat_id": TELEGRAM_CHAT_ID, "text": text, "parse_mode": "HTML"}
-
-    try:
-        resp = requests.post(url, json=payload, timeout=5)
-        return resp.status_code == 200
-    except Exception as e:
-        logger.error(f"TELEGRAM ERROR: {e}")
-        return False
\ No newline at end of file
+import html
+import os
+import re
+import threading
+import time
+import requests
+import logging
+from collections import Counter
+from typing import List
+from requests.adapters import HTTPAdapter
+
+from app.services.outbox import outbox, RetryAfter
+from app.services.metrics import dependency_call
+
+logger = logging.getLogger("Telegram")
+
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+
+# События за окно TELEGRAM_DIGEST_WINDOW секунд уходят одной сводкой (0 — без сводок)
+TELEGRAM_DIGEST_WINDOW = float(os.getenv("TELEGRAM_DIGEST_WINDOW", "60"))
+# Лимит на чат: Telegram допускает около 20 сообщений в минуту в группу
+TELEGRAM_RATE_PER_MIN = float(os.getenv("TELEGRAM_RATE_PER_MIN", "20"))
+TELEGRAM_BURST = int(os.getenv("TELEGRAM_BURST", "3"))
+TELEGRAM_MAX_LEN = 4096
+
+# Одна сессия на процесс: TLS-соединение с api.telegram.org переиспользуется
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Берёт токен и возвращает 0, либо возвращает, сколько секунд ждать до токена"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+_bucket = TokenBucket(TELEGRAM_RATE_PER_MIN / 60, TELEGRAM_BURST)
+
+
+def deliver(text: str) -> bool:
+    """Отправка для outbox: временные ошибки — исключением, чтобы была повторная попытка.
+    False — сообщение отброшено (нет настроек или Telegram его не примет).
+    """
+    if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
+        logger.warning("TELEGRAM: нет токена или ID чата")
+        return False
+
+    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
+    payload = {"chat_id": TELEGRAM_CHAT_ID, "text": text, "parse_mode": "HTML"}
+
+    with dependency_call("telegram", "sendMessage"):
+        resp = _session.post(url, json=payload, timeout=5)
+    if resp.status_code == 200:
+        return True
+    try:
+        body = resp.json()
+    except ValueError:
+        body = {}
+    if resp.status_code == 429:
+        # Telegram сообщает, через сколько секунд можно писать снова
+        raise RetryAfter(float(body.get("parameters", {}).get("retry_after", 5)))
+    if 400 <= resp.status_code < 500:
+        # Повтор не поможет (битый HTML, неверный чат) — не держим очередь
+        logger.error("TELEGRAM ERROR %s: %s", resp.status_code, body.get("description", ""))
+        return False
+    raise Exception(f"Telegram ответил {resp.status_code}")
+
+
+def send_message(text: str) -> bool:
+    try:
+        return deliver(text)
+    except Exception as e:
+        logger.error("TELEGRAM ERROR: %s", e)
+        return False
+
+
+def split_message(blocks: List[str], limit: int = TELEGRAM_MAX_LEN) -> List[str]:
+    """Склеивает блоки в сообщения не длиннее limit, разрезая только между блоками.
+    Блок длиннее лимита режется по строкам, а одна слишком длинная строка —
+    по символам (см. _split_line).
+    """
+    # (разделитель перед куском, кусок): блоки разделяем пустой строкой,
+    # куски одного блока — переводом строки
+    pieces = []
+    for block in blocks:
+        if len(block) <= limit:
+            pieces.append(("\n\n", block))
+            continue
+        sep = "\n\n"
+        for line in block.split("\n"):
+            for part in _split_line(line, limit) if len(line) > limit else [line]:
+                pieces.append((sep, part))
+                sep = ""
+            sep = "\n"
+
+    messages: List[str] = []
+    current = ""
+    for sep, piece in pieces:
+        if current and len(current) + len(sep) + len(piece) <= limit:
+            current += sep + piece
+        else:
+            if current:
+                messages.append(current)
+            current = piece
+    if current:
+        messages.append(current)
+    return messages
+
+
+_HTML_TAG = re.compile(r"<[^>]*>")
+
+
+def _split_line(line: str, limit: int) -> List[str]:
+    """Режет строку длиннее limit на куски, которые Telegram примет с parse_mode=HTML.
+
+    Теги из такой строки убираются: разрезанный <b>…</b> даёт 400 «can't parse
+    entities». Текст заново экранируется, и разрез не попадает внутрь &lt; / &amp;.
+    """
+    text = html.escape(html.unescape(_HTML_TAG.sub("", line)), quote=False)
+    parts = []
+    while len(text) > limit:
+        cut = limit
+        amp = text.rfind("&", 0, limit)
+        if amp > 0 and text.find(";", amp) >= limit:
+            cut = amp
+        parts.append(text[:cut])
+        text = text[cut:]
+    parts.append(text)
+    return parts
+
+
+def build_digest(events: List[dict]) -> List[str]:
+    """Сообщения сводки по событиям одного окна"""
+    texts = [e["text"] for e in events]
+    if len(events) == 1:
+        return split_message(texts)
+    counts = Counter(e.get("title") or "Уведомления" for e in events)
+    header = f"🗂 <b>Сводка за {TELEGRAM_DIGEST_WINDOW:.0f} с</b>: {len(events)} событий\n" + "\n".join(
+        f"• {title}: {n}" for title, n in counts.items()
+    )
+    return split_message([header] + texts)
+
+
+def notify(text: str, title: str = "") -> None:
+    """Ставит сообщение в outbox; отправит фоновый поток, не задерживая ответ.
+    title — вид события для строки-счётчика в сводке («Готовая продукция: 5»).
+    """
+    if TELEGRAM_DIGEST_WINDOW <= 0:
+        outbox.enqueue("telegram", {"text": text})
+        return
+    # Окна выровнены по часам: все события одного окна становятся
+    # готовыми к отправке одновременно и уходят одной сводкой
+    now = time.time()
+    delay = TELEGRAM_DIGEST_WINDOW - now % TELEGRAM_DIGEST_WINDOW
+    outbox.enqueue("telegram_digest", {"text": text, "title": title, "at": now}, delay=delay)
+
+
+def _send_limited(payload: dict) -> None:
+    wait = _bucket.reserve()
+    if wait > 0:
+        raise RetryAfter(wait, "лимит сообщений в чат")
+    deliver(payload["text"])
+
+
+def _send_digest(events: List[dict]) -> None:
+    # Каждая часть сводки — отдельное задание: при сбое повторяется только она
+    events.sort(key=lambda e: e.get("at", 0))
+    for text in build_digest(events):
+        outbox.enqueue("telegram", {"text": text})
+
+
+outbox.register("telegram", _send_limited)
+outbox.register_batch("telegram_digest", _send_digest)
@@ -0,0 +1,42 @@
+# Запуск заглушек Supabase и Google Sheets в одном процессе.
+#
+#   python -m benchmarks.fakes --db-port 54321 --sheets-port 54322 \
+#       --db-latency 20 --sheets-latency 300
+#
+# Приложение направляется на них переменными окружения:
+#   SUPABASE_URL=http://127.0.0.1:54321  SUPABASE_KEY=<любой>
+#   GOOGLE_API_ENDPOINT=http://127.0.0.1:54322/
+import argparse
+import asyncio
+
+import uvicorn
+
+from benchmarks.fakes import postgrest, sheets
+
+
+async def serve(db_port: int, sheets_port: int, db_latency: float, sheets_latency: float) -> None:
+    servers = [
+        uvicorn.Server(uvicorn.Config(
+            postgrest.create_app(latency=db_latency), host="127.0.0.1", port=db_port,
+            log_level="warning", access_log=False,
+        )),
+        uvicorn.Server(uvicorn.Config(
+            sheets.create_app(latency=sheets_latency), host="127.0.0.1", port=sheets_port,
+            log_level="warning", access_log=False,
+        )),
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушки Supabase и Google Sheets для бенчмарков")
+    parser.add_argument("--db-port", type=int, default=54321)
+    parser.add_argument("--sheets-port", type=int, default=54322)
+    parser.add_argument("--db-latency", type=float, default=0, help="задержка ответа БД, мс")
+    parser.add_argument("--sheets-latency", type=float, default=0, help="задержка ответа Sheets, мс")
+    args = parser.parse_args()
+    asyncio.run(serve(args.db_port, args.sheets_port, args.db_latency / 1000, args.sheets_latency / 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+# Заглушка Supabase (PostgREST) для бенчмарков: таблицы в памяти процесса.
+#
+# Понимает то подмножество REST, которым пользуется приложение:
+#   GET / POST / PATCH / DELETE /rest/v1/<таблица>
+#     фильтры eq. / in.() / gte. / lte., select, order, offset/limit,
+#     Prefer: return=minimal|representation, resolution=ignore-duplicates
+#   POST /rest/v1/rpc/scan_box_production, scan_boxes_production, create_batch_boxes
+# Логика RPC повторяет функции из supabase/migrations (включая счётчик
+# batches.produced_count), но без блокировок: запросы обрабатываются по одному
+# в цикле событий, поэтому гонок между ними нет.
+#
+# Служебные ручки для бенчмарка:
+#   POST /_bench/reset  {"batches": 200, "boxes_per_batch": 500}
+#   GET  /_bench/stats  — число строк по таблицам и обработанных запросов
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+
+def box_id(n: int) -> str:
+    """Детерминированный id коробки: генератор нагрузки знает их заранее"""
+    return str(uuid.UUID(int=n))
+
+
+class Store:
+    def __init__(self):
+        self.tables: Dict[str, Dict[str, dict]] = {}
+        self.next_batch_id = 1
+        self.requests = 0
+
+    def reset(self, batches: int = 0, boxes_per_batch: int = 0, planned: Optional[int] = None) -> None:
+        """batches партий, в каждой boxes_per_batch коробок со статусом CREATED.
+
+        Коробки k-й по счёту партии (с нуля) — box_id(k * boxes_per_batch + 1 ... + boxes_per_batch).
+        """
+        self.tables = {name: {} for name in ("batches", "boxes", "inventory_sessions", "inventory_scans")}
+        # Как sequence в Postgres: после очистки id партий не начинаются заново
+        # (иначе PDF новой партии 1 совпал бы с закэшированным PDF старой)
+        first_batch = self.next_batch_id
+        for _ in range(batches):
+            batch = self.new_batch({
+                "product_info": f"Соус Майонезный Провансаль 67% Бренд {self.next_batch_id} (12 шт/кор.)",
+                "planned_quantity": planned if planned is not None else boxes_per_batch,
+                "batch_number": str(self.next_batch_id - first_batch + 1),
+                "label_info": None,
+            })
+            first = (batch["id"] - first_batch) * boxes_per_batch
+            for box_no in range(1, boxes_per_batch + 1):
+                self.insert("boxes", {
+                    "id": box_id(first + box_no),
+                    "batch_id": batch["id"],
+                    "status": "CREATED",
+                    "box_no": box_no,
+                })
+
+    def new_batch(self, row: dict) -> dict:
+        row = {"created_at": _now(), "produced_count": 0, **row, "id": self.next_batch_id}
+        self.next_batch_id += 1
+        self.tables["batches"][str(row["id"])] = row
+        return row
+
+    def insert(self, table: str, row: dict) -> dict:
+        if table == "batches":
+            return self.new_batch(row)
+        row = dict(row)
+        if table == "inventory_sessions":
+            row.setdefault("id", str(uuid.uuid4()))
+            row.setdefault("started_at", _now())
+            row.setdefault("finished_at", None)
+        if table == "inventory_scans":
+            row.setdefault("scanned_at", _now())
+        self.tables[table][_key(table, row)] = row
+        if table == "boxes":
+            self._track_produced(None, row)
+        return row
+
+    def update(self, table: str, row: dict, data: dict) -> None:
+        old = dict(row)
+        row.update(data)
+        if table == "boxes":
+            self._track_produced(old, row)
+
+    def delete(self, table: str, row: dict) -> None:
+        del self.tables[table][_key(table, row)]
+        if table == "boxes":
+            self._track_produced(row, None)
+
+    def _track_produced(self, old: Optional[dict], new: Optional[dict]) -> None:
+        """Как триггер boxes_track_produced: в счёте коробки, вышедшие из CREATED"""
+        for row, delta in ((old, -1), (new, 1)):
+            if row and _produced(row) and row.get("batch_id") is not None:
+                batch = self.tables["batches"].get(str(row["batch_id"]))
+                if batch:
+                    batch["produced_count"] += delta
+
+    # --- RPC ---
+
+    def scan_box_production(self, p_box_id, p_scanned_at=None, p_user_name=None,
+                            p_machine_id=None, p_coworkers=None) -> dict:
+        box = self.tables["boxes"].get(str(p_box_id))
+        if box is None:
+            return {"result": "unknown"}
+        if box.get("status") == "PRODUCED":
+            return {"result": "duplicate"}
+        batch = self.tables["batches"].get(str(box.get("batch_id")))
+        if (batch is not None and not _produced(box)
+                and batch["produced_count"] >= (batch.get("planned_quantity") or 0)):
+            return {"result": "plan_exceeded"}
+        self.update("boxes", box, {
+            "status": "PRODUCED",
+            "scanned_at": p_scanned_at or _now(),
+            "scanned_by_user_name": p_user_name,
+            "produced_on_machine_id": p_machine_id,
+            "coworkers": p_coworkers,
+        })
+        return {"result": "ok"}
+
+    def scan_boxes_production(self, p_items: List[dict]) -> List[dict]:
+        return [
+            self.scan_box_production(
+                item.get("id"), item.get("scanned_at"), item.get("scanned_by_user_name"),
+                item.get("produced_on_machine_id"), item.get("coworkers"),
+            )
+            for item in p_items
+        ]
+
+    def create_batch_boxes(self, p_batch_id, p_count: int) -> List[str]:
+        ids = [str(uuid.uuid4()) for _ in range(p_count)]
+        for box_no, new_id in enumerate(ids, start=1):
+            self.insert("boxes", {"id": new_id, "batch_id": p_batch_id, "status": "CREATED", "box_no": box_no})
+        return ids
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _produced(box: dict) -> bool:
+    return (box.get("status") or "CREATED") != "CREATED"
+
+
+def _key(table: str, row: dict) -> str:
+    if table == "inventory_scans":
+        return f"{row['session_id']}/{row['box_id']}"
+    return str(row["id"])
+
+
+# --- Фильтры PostgREST ---
+
+def _parse_in(value: str) -> List[str]:
+    # in.(a,b,"c,d") — значения в кавычках могут содержать запятые
+    inner = value[1:-1] if value.startswith("(") else value
+    items, current, quoted = [], "", False
+    for ch in inner:
+        if ch == '"':
+            quoted = not quoted
+        elif ch == "," and not quoted:
+            items.append(current)
+            current = ""
+        else:
+            current += ch
+    items.append(current)
+    return items
+
+
+def _comparable(a, b):
+    """Числа сравниваем как числа (box_no, id партии), остальное — как строки"""
+    try:
+        return float(a), float(b)
+    except (TypeError, ValueError):
+        return str(a), str(b)
+
+
+def _make_filter(column: str, expr: str) -> Callable[[dict], bool]:
+    op, _, value = expr.partition(".")
+    if op == "eq":
+        return lambda row: str(row.get(column)) == value
+    if op == "in":
+        allowed = set(_parse_in(value))
+        return lambda row: str(row.get(column)) in allowed
+    if op in ("gte", "lte", "gt", "lt"):
+        def compare(row):
+            if row.get(column) is None:
+                return False
+            left, right = _comparable(row[column], value)
+            return {"gte": left >= right, "lte": left <= right, "gt": left > right, "lt": left < right}[op]
+        return compare
+    raise ValueError(f"Фильтр {op} не поддерживается заглушкой")
+
+
+_RESERVED_PARAMS = {"select", "order", "offset", "limit", "columns", "on_conflict"}
+
+
+def _matching(store: Store, table: str, request: Request) -> List[dict]:
+    filters = [
+        _make_filter(column, expr)
+        for column, expr in request.query_params.multi_items()
+        if column not in _RESERVED_PARAMS
+    ]
+    # Частый случай id=eq.X — без обхода всей таблицы
+    expr = request.query_params.get("id", "")
+    if table != "inventory_scans" and expr.startswith("eq."):
+        row = store.tables[table].get(expr[3:])
+        rows = [row] if row is not None else []
+    else:
+        rows = list(store.tables[table].values())
+    return [row for row in rows if all(f(row) for f in filters)]
+
+
+def _project(rows: List[dict], select: Optional[str]) -> List[dict]:
+    if not select or select == "*":
+        return [dict(row) for row in rows]
+    columns = [c.strip() for c in select.split(",")]
+    return [{c: row.get(c) for c in columns} for row in rows]
+
+
+def _order_and_page(rows: List[dict], request: Request) -> List[dict]:
+    order = request.query_params.get("order")
+    if order:
+        # Сортируем с последнего ключа, чтобы первый был главным
+        for part in reversed(order.split(",")):
+            column, _, direction = part.partition(".")
+            rows.sort(key=lambda r: _sort_key(r.get(column)), reverse=direction.startswith("desc"))
+    offset = int(request.query_params.get("offset", 0))
+    limit = request.query_params.get("limit")
+    return rows[offset:offset + int(limit)] if limit else rows[offset:]
+
+
+def _sort_key(value):
+    return (value is None, value if isinstance(value, (int, float)) else str(value))
+
+
+def _prefer(request: Request) -> str:
+    return request.headers.get("prefer", "")
+
+
+def _reply(request: Request, rows: List[dict], status: int) -> Response:
+    if "return=minimal" in _prefer(request):
+        return Response(status_code=204 if status == 200 else status)
+    return JSONResponse(_project(rows, request.query_params.get("select")), status_code=status)
+
+
+def create_app(store: Optional[Store] = None, latency: float = 0.0) -> FastAPI:
+    """latency — задержка каждого ответа в секундах (сеть до Supabase и работа Postgres)"""
+    store = store or Store()
+    store.reset()
+    app = FastAPI(title="PostgREST stand-in")
+    app.state.store = store
+
+    @app.middleware("http")
+    async def add_latency(request: Request, call_next):
+        store.requests += 1
+        if latency and not request.url.path.startswith("/_bench"):
+            await asyncio.sleep(latency)
+        return await call_next(request)
+
+    @app.post("/_bench/reset")
+    async def bench_reset(request: Request):
+        params = await request.json() if await request.body() else {}
+        store.reset(**params)
+        return {name: len(rows) for name, rows in store.tables.items()}
+
+    @app.get("/_bench/stats")
+    def bench_stats():
+        stats = {name: len(rows) for name, rows in store.tables.items()}
+        stats["requests"] = store.requests
+        return stats
+
+    @app.post("/rest/v1/rpc/{name}")
+    async def rpc(name: str, request: Request):
+        handler = getattr(store, name, None) if name in RPC_FUNCTIONS else None
+        if handler is None:
+            return JSONResponse({"message": f"function {name} not found"}, status_code=404)
+        return JSONResponse(handler(**(await request.json())))
+
+    @app.get("/rest/v1/{table}")
+    def select(table: str, request: Request):
+        if table not in store.tables:
+            return _unknown_table(table)
+        rows = _order_and_page(_matching(store, table, request), request)
+        return JSONResponse(_project(rows, request.query_params.get("select")))
+
+    @app.post("/rest/v1/{table}")
+    async def insert(table: str, request: Request):
+        if table not in store.tables:
+            return _unknown_table(table)
+        payload = await request.json()
+        rows = payload if isinstance(payload, list) else [payload]
+        ignore_duplicates = "resolution=ignore-duplicates" in _prefer(request)
+        created = []
+        for row in rows:
+            if table != "batches" and _key_or_none(table, row) in store.tables[table]:
+                if ignore_duplicates:
+                    continue
+                return JSONResponse({"code": "23505", "message": "duplicate key value"}, status_code=409)
+            created.append(store.insert(table, row))
+        return _reply(request, created, 201)
+
+    @app.patch("/rest/v1/{table}")
+    async def update(table: str, request: Request):
+        if table not in store.tables:
+            return _unknown_table(table)
+        data = await request.json()
+        rows = _matching(store, table, request)
+        for row in rows:
+            store.update(table, row, data)
+        return _reply(request, rows, 200)
+
+    @app.delete("/rest/v1/{table}")
+    def delete(table: str, request: Request):
+        if table not in store.tables:
+            return _unknown_table(table)
+        rows = _matching(store, table, request)
+        for row in rows:
+            store.delete(table, row)
+        return _reply(request, rows, 200)
+
+    return app
+
+
+RPC_FUNCTIONS = ("scan_box_production", "scan_boxes_production", "create_batch_boxes")
+
+
+def _key_or_none(table: str, row: dict) -> Optional[str]:
+    try:
+        return _key(table, row)
+    except KeyError:
+        return None
+
+
+def _unknown_table(table: str) -> JSONResponse:
+    return JSONResponse({"code": "42P01", "message": f'relation "public.{table}" does not exist'}, status_code=404)
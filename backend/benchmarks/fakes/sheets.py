@@ -0,0 +1,181 @@
+# Заглушка Google Sheets API v4 для бенчмарков.
+#
+# Приложение ходит сюда, если задан GOOGLE_API_ENDPOINT (см. google_client).
+# Поддержаны вызовы, которые делает приложение, и values.get:
+#   GET  /v4/spreadsheets/<id>                   — метаданные листов
+#   GET  /v4/spreadsheets/<id>/values:batchGet   — справочники
+#   GET  /v4/spreadsheets/<id>/values/<range>    — values.get
+#   POST /v4/spreadsheets/<id>/values/<range>:append
+#   POST /v4/spreadsheets/<id>:batchUpdate       — addSheet и appendCells
+# Токен не проверяется. Все таблицы (любой id) общие: справочники
+# users / machines / brands заполнены при старте, отчёты пишутся в память.
+#
+#   POST /_bench/reset {"users": 50, "brands": 300}
+#   GET  /_bench/stats — сколько строк дописано по листам и вызовов по методам
+import asyncio
+from collections import Counter
+from typing import Dict, List
+from urllib.parse import unquote
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+BRAND_HEADER = ["Тип", "Категория", "Рецептура", "Бренд", "кол-во шт в коробке", "aliases"]
+
+
+def user_name(n: int) -> str:
+    return f"Оператор {n}"
+
+
+def user_pin(n: int) -> str:
+    return f"{1000 + n}"
+
+
+class Workbook:
+    def __init__(self):
+        self.sheets: Dict[str, List[List[str]]] = {}
+        self.sheet_ids: Dict[str, int] = {}
+        self.calls: Counter = Counter()
+
+    def reset(self, users: int = 50, machines: int = 10, brands: int = 300) -> None:
+        self.sheets = {
+            "users": [["Имя", "PIN"]] + [[user_name(i), user_pin(i)] for i in range(1, users + 1)],
+            "machines": [["Machine_ID", "Name", "Types", "Categories", "Active"]] + [
+                [f"M{i}", f"Линия {i}", "Соус", "Майонезный", "TRUE"] for i in range(1, machines + 1)
+            ],
+            "brands": [BRAND_HEADER] + [
+                ["Соус", "Майонезный", "Провансаль 67%", f"Бренд {i}", "12", f"brand{i}"]
+                for i in range(1, brands + 1)
+            ],
+        }
+        self.sheet_ids: Dict[str, int] = {title: i for i, title in enumerate(self.sheets)}
+        self.calls.clear()
+
+    def properties(self) -> List[dict]:
+        return [{"properties": {"sheetId": self.sheet_ids[title], "title": title}} for title in self.sheets]
+
+    def read(self, a1_range: str) -> dict:
+        # Диапазон внутри листа не разбираем: отдаём лист целиком, как A1:Z2000
+        title = _sheet_title(a1_range)
+        if title not in self.sheets:
+            raise KeyError(title)
+        return {"range": a1_range, "majorDimension": "ROWS", "values": self.sheets[title]}
+
+    def append(self, a1_range: str, rows: List[list]) -> dict:
+        title = _sheet_title(a1_range)
+        if title not in self.sheets:
+            raise KeyError(title)
+        self.sheets[title].extend(rows)
+        return {"updates": {"updatedRange": a1_range, "updatedRows": len(rows)}}
+
+    def batch_update(self, requests: List[dict]) -> dict:
+        # Как в Google, запрос применяется целиком или никак
+        sheets = {title: list(rows) for title, rows in self.sheets.items()}
+        sheet_ids = dict(self.sheet_ids)
+        replies = []
+        for req in requests:
+            if "addSheet" in req:
+                props = req["addSheet"].get("properties", {})
+                title = props.get("title")
+                if title in sheets:
+                    raise ValueError(f'A sheet with the name "{title}" already exists')
+                sheets[title] = []
+                sheet_ids[title] = props.get("sheetId", len(sheet_ids))
+                replies.append({"addSheet": {"properties": {"sheetId": sheet_ids[title], "title": title}}})
+            elif "appendCells" in req:
+                cells = req["appendCells"]
+                title = next((t for t, sid in sheet_ids.items() if sid == cells.get("sheetId")), None)
+                if title is None:
+                    raise ValueError(f"No grid with id: {cells.get('sheetId')}")
+                sheets[title].extend(
+                    [next(iter(cell.get("userEnteredValue", {}).values()), "") for cell in row.get("values", [])]
+                    for row in cells.get("rows", [])
+                )
+                replies.append({})
+            else:
+                replies.append({})
+        self.sheets = sheets
+        self.sheet_ids = sheet_ids
+        return {"replies": replies}
+
+
+def _sheet_title(a1_range: str) -> str:
+    title = a1_range.rsplit("!", 1)[0] if "!" in a1_range else a1_range
+    if title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title
+
+
+def _not_found(a1_range: str) -> JSONResponse:
+    return JSONResponse(
+        {"error": {"code": 400, "message": f"Unable to parse range: {a1_range}", "status": "INVALID_ARGUMENT"}},
+        status_code=400,
+    )
+
+
+def create_app(workbook: Workbook = None, latency: float = 0.0) -> FastAPI:
+    """latency — задержка каждого ответа в секундах (Google отвечает за 100–500 мс)"""
+    workbook = workbook or Workbook()
+    workbook.reset()
+    app = FastAPI(title="Sheets API stand-in")
+    app.state.workbook = workbook
+
+    @app.middleware("http")
+    async def add_latency(request: Request, call_next):
+        if latency and not request.url.path.startswith("/_bench"):
+            await asyncio.sleep(latency)
+        return await call_next(request)
+
+    @app.post("/_bench/reset")
+    async def bench_reset(request: Request):
+        params = await request.json() if await request.body() else {}
+        workbook.reset(**params)
+        return {title: len(rows) for title, rows in workbook.sheets.items()}
+
+    @app.get("/_bench/stats")
+    def bench_stats():
+        return {"rows": {title: len(rows) for title, rows in workbook.sheets.items()},
+                "calls": dict(workbook.calls)}
+
+    # Путь разбираем сами: в нём двоеточия (values:batchGet, <range>:append)
+    @app.api_route("/v4/spreadsheets/{rest:path}", methods=["GET", "POST"])
+    async def spreadsheets(rest: str, request: Request):
+        spreadsheet, _, tail = unquote(rest).partition("/")
+
+        if not tail:
+            if spreadsheet.endswith(":batchUpdate"):
+                workbook.calls["batchUpdate"] += 1
+                body = await request.json()
+                try:
+                    return workbook.batch_update(body.get("requests", []))
+                except ValueError as e:
+                    return JSONResponse(
+                        {"error": {"code": 400, "message": str(e), "status": "INVALID_ARGUMENT"}},
+                        status_code=400,
+                    )
+            workbook.calls["get"] += 1
+            return {"spreadsheetId": spreadsheet, "sheets": workbook.properties()}
+
+        if tail == "values:batchGet":
+            workbook.calls["values.batchGet"] += 1
+            ranges = request.query_params.getlist("ranges")
+            try:
+                return {"spreadsheetId": spreadsheet, "valueRanges": [workbook.read(r) for r in ranges]}
+            except KeyError as e:
+                return _not_found(str(e))
+
+        if tail.startswith("values/"):
+            a1_range = tail[len("values/"):]
+            try:
+                if request.method == "POST" and a1_range.endswith(":append"):
+                    workbook.calls["values.append"] += 1
+                    body = await request.json()
+                    return workbook.append(a1_range[:-len(":append")], body.get("values", []))
+                workbook.calls["values.get"] += 1
+                return workbook.read(a1_range)
+            except KeyError:
+                return _not_found(a1_range)
+
+        return JSONResponse({"error": {"code": 404, "message": "Not found"}}, status_code=404)
+
+    return app
@@ -0,0 +1,216 @@
+# Микробенчмарк рендера этикеток (без API, БД и сети).
+#
+# Запуск из папки backend:
+#   python -m benchmarks.labels                          # все движки, 100 и 1000 этикеток
+#   python -m benchmarks.labels render --counts 500 --repeat 5
+#   python -m benchmarks.labels base64 --profile cprofile --profile-dir /tmp/prof
+#
+# Движок — функция (коробки, данные этикетки) -> байты результата,
+# зарегистрированная декоратором @engine. Новый способ рендера добавляется
+# сюда же, и его можно сравнить со старыми на тех же данных.
+#
+# Каждый замер идёт в отдельном процессе, чтобы пиковая память (RSS)
+# относилась к одному прогону, а не ко всем сразу. Печатает этикеток
+# в секунду (по лучшему из --repeat прогонов), пиковый RSS процесса
+# и размер результата. С --profile сохраняет профиль одного прогона:
+# cProfile (.prof, открывается snakeviz/pstats) или pyinstrument (.html).
+# Профилируется только процесс замера: у stream_parallel рендер идёт
+# в пуле, и в профиле будет видно лишь ожидание и склейку.
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+from typing import Callable, Dict, Optional
+
+from reportlab.graphics import renderPDF
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.graphics.shapes import Drawing
+from reportlab.pdfbase import pdfmetrics
+
+from app.services import pdf
+from benchmarks.pdf_parallel import LABEL_INFO, make_boxes as make_ids
+
+Engine = Callable[[list, dict], bytes]
+ENGINES: Dict[str, Engine] = {}
+
+
+def engine(name: str) -> Callable[[Engine], Engine]:
+    def register(func: Engine) -> Engine:
+        ENGINES[name] = func
+        return func
+    return register
+
+
+@engine("render")
+def render_single(boxes: list, label_info: dict) -> bytes:
+    """Один документ в текущем процессе (то, что делает каждый воркер пула)"""
+    return pdf.render_labels_pdf(boxes, label_info)
+
+
+@engine("base64")
+def render_base64(boxes: list, label_info: dict) -> bytes:
+    """generate_pdf_base64 как есть — вместе с кодированием ответа"""
+    return pdf.generate_pdf_base64(boxes, label_info).encode("ascii")
+
+
+@engine("stream")
+def render_stream(boxes: list, label_info: dict) -> bytes:
+    """Потоковая склейка кусков в одном процессе (/api/print/<id>.pdf)"""
+    return b"".join(pdf.iter_labels_pdf(boxes, label_info, workers=1))
+
+
+@engine("stream_parallel")
+def render_stream_parallel(boxes: list, label_info: dict) -> bytes:
+    """Потоковая склейка с рендером кусков в пуле из PDF_WORKERS процессов"""
+    return b"".join(pdf.iter_labels_pdf(boxes, label_info, workers=pdf.PDF_WORKERS))
+
+
+class _WidgetQrTemplate(pdf.LabelTemplate):
+    """QR через QrCodeWidget и renderPDF, как до LABEL_RENDER_VERSION 2"""
+
+    def draw(self, c, box_id, box_no) -> None:
+        c.doForm(self.FORM_NAME)
+        qr_widget = QrCodeWidget(box_id)
+        bounds = qr_widget.getBounds()
+        d = Drawing(pdf.QR_SIZE, pdf.QR_SIZE, transform=[
+            pdf.QR_SIZE / (bounds[2] - bounds[0]), 0, 0, pdf.QR_SIZE / (bounds[3] - bounds[1]), 0, 0,
+        ])
+        d.add(qr_widget)
+        renderPDF.draw(d, c, pdf.QR_X, pdf.QR_Y)
+
+        txt = f"Коробка № {box_no}"
+        c.setFont(self.font, self.number_size)
+        width = pdfmetrics.stringWidth(txt, self.font, self.number_size)
+        c.drawString(self._text_left + (self._max_text_width - width) / 2, self.number_y, txt)
+
+
+@engine("render_widget_qr")
+def render_widget_qr(boxes: list, label_info: dict) -> bytes:
+    """Как render, но со старым QR — чтобы видеть выигрыш services/qr.py"""
+    return pdf.render_labels_pdf(boxes, _WidgetQrTemplate(label_info))
+
+
+def make_boxes(count: int) -> list:
+    # Фиксированные id и номера: прогоны сравнимы между собой
+    return [dict(box, box_no=no) for no, box in enumerate(make_ids(count), start=1)]
+
+
+def _peak_rss_kb(who: int) -> int:
+    # В Linux ru_maxrss в килобайтах, в macOS — в байтах
+    peak = resource.getrusage(who).ru_maxrss
+    return peak // 1024 if os.uname().sysname == "Darwin" else peak
+
+
+def _profiled(profiler: str, path: str, func: Callable[[], bytes]) -> bytes:
+    if profiler == "cprofile":
+        import cProfile
+        import pstats
+        prof = cProfile.Profile()
+        result = prof.runcall(func)
+        prof.dump_stats(path + ".prof")
+        pstats.Stats(prof).sort_stats("cumulative").print_stats(15)
+        return result
+
+    from pyinstrument import Profiler
+    prof = Profiler()
+    prof.start()
+    try:
+        result = func()
+    finally:
+        prof.stop()
+    with open(path + ".html", "w", encoding="utf-8") as f:
+        f.write(prof.output_html())
+    print(prof.output_text(unicode=True, color=False))
+    return result
+
+
+def measure(name: str, count: int, repeat: int, profiler: Optional[str], profile_dir: str) -> dict:
+    """Один замер; вызывается в отдельном процессе"""
+    render = ENGINES[name]
+    boxes = make_boxes(count)
+    # Прогрев: шрифты, импорты reportlab и пул процессов не должны попадать в замер
+    render(make_boxes(min(count, 10)), LABEL_INFO)
+
+    times = []
+    output = b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = render(boxes, LABEL_INFO)
+        times.append(time.perf_counter() - started)
+
+    if profiler:
+        os.makedirs(profile_dir, exist_ok=True)
+        _profiled(profiler, os.path.join(profile_dir, f"{name}_{count}"), lambda: render(boxes, LABEL_INFO))
+
+    # Ждём выхода процессов пула, иначе их пиковый RSS ещё не учтён
+    pdf.shutdown_pool(wait=True)
+    best = min(times)
+    return {
+        "engine": name,
+        "labels": count,
+        "best_s": round(best, 4),
+        "labels_per_s": round(count / best, 1),
+        "peak_rss_mb": round(_peak_rss_kb(resource.RUSAGE_SELF) / 1024, 1),
+        "children_peak_rss_mb": round(_peak_rss_kb(resource.RUSAGE_CHILDREN) / 1024, 1),
+        "output_bytes": len(output),
+        "render_version": pdf.LABEL_RENDER_VERSION,
+    }
+
+
+def _measure_to_queue(queue, *args) -> None:
+    queue.put(measure(*args))
+
+
+def run_isolated(ctx, *args) -> dict:
+    """measure() в новом процессе; обычный Process, а не Pool — пулу рендера нужны дочерние процессы"""
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure_to_queue, args=(queue, *args))
+    proc.start()
+    try:
+        return queue.get()
+    finally:
+        proc.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк рендера этикеток")
+    parser.add_argument("engines", nargs="*", metavar="engine",
+                        help="движки (по умолчанию все): " + ", ".join(ENGINES))
+    parser.add_argument("--counts", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--repeat", type=int, default=3, help="прогонов на замер (берётся лучший)")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"],
+                        help="снять профиль одного дополнительного прогона")
+    parser.add_argument("--profile-dir", default="profiles")
+    parser.add_argument("--json", dest="json_path", help="записать результаты в JSON-файл")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.engines if name not in ENGINES]
+    if unknown:
+        parser.error(f"неизвестные движки: {', '.join(unknown)}")
+    if args.profile == "pyinstrument":
+        try:
+            import pyinstrument  # noqa: F401
+        except ImportError:
+            parser.error("pyinstrument не установлен: pip install pyinstrument")
+
+    # spawn: у каждого замера чистый процесс и свой пиковый RSS
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    print(f"{'движок':<16} {'этикеток':>9} {'лучшее, с':>10} {'этик./с':>9} "
+          f"{'RSS, МБ':>8} {'RSS пула':>9} {'вывод, КБ':>10}")
+    for name in args.engines or list(ENGINES):
+        for count in args.counts:
+            r = run_isolated(ctx, name, count, args.repeat, args.profile, args.profile_dir)
+            results.append(r)
+            print(f"{r['engine']:<16} {r['labels']:>9} {r['best_s']:>10.3f} {r['labels_per_s']:>9.1f} "
+                  f"{r['peak_rss_mb']:>8.1f} {r['children_peak_rss_mb']:>9.1f} {r['output_bytes'] / 1024:>10.0f}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+# Нагрузочные сценарии для API без сети и без настоящих Supabase и Google.
+#
+# Запуск из папки backend:
+#   python -m benchmarks.load                          # все сценарии, сравнение с базой
+#   python -m benchmarks.load scan login_storm         # только выбранные
+#   python -m benchmarks.load --save-baseline          # записать новую базу
+#
+# Поднимает два процесса: заглушки БД и Sheets (benchmarks/fakes) и само
+# приложение (uvicorn, один воркер), которое смотрит на заглушки через
+# SUPABASE_URL и GOOGLE_API_ENDPOINT. Нагрузку даёт этот процесс.
+#
+# Для каждого сценария печатает число запросов, ошибки, RPS и p50/p95/p99.
+# База хранится в benchmarks/baselines/<сценарий>.json. Если база снята
+# с теми же параметрами, печатается изменение, а при росте p95 или падении
+# RPS больше чем на --tolerance скрипт завершается с кодом 1.
+# База зависит от машины, поэтому в репозиторий не попадает (папка в
+# .gitignore): её снимают локально или на CI-раннере перед изменением
+# и сравнивают с ней прогон после. В базе записано окружение, в том
+# числе число ядер: база с другим числом ядер не сравнивается — печать
+# на одном ядре не проходит через пул процессов рендера.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from app.services.pdf import LABEL_RENDER_VERSION
+from benchmarks.fakes.postgrest import box_id
+from benchmarks.fakes.sheets import user_name, user_pin
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES_DIR = os.path.join(BACKEND_DIR, "benchmarks", "baselines")
+
+# Задержки заглушек по умолчанию, мс: Supabase в том же регионе и Google Sheets
+DB_LATENCY_MS = 5
+SHEETS_LATENCY_MS = 300
+
+
+class Result:
+    def __init__(self, latencies: List[float], errors: int, elapsed: float):
+        self.latencies = latencies
+        self.errors = errors
+        self.elapsed = elapsed
+
+    def summary(self) -> dict:
+        ordered = sorted(self.latencies) or [0.0]
+        if len(ordered) > 1:
+            cuts = statistics.quantiles(ordered, n=100, method="inclusive")
+            p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+        else:
+            p50 = p95 = p99 = ordered[0]
+        return {
+            "requests": len(self.latencies),
+            "errors": self.errors,
+            "rps": round(len(self.latencies) / self.elapsed, 2) if self.elapsed else 0.0,
+            "p50_ms": round(p50 * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2),
+            "p99_ms": round(p99 * 1000, 2),
+        }
+
+
+async def run_clients(clients: int, per_client: int,
+                      request: Callable[[int, int], Awaitable[httpx.Response]]) -> Result:
+    """clients параллельных клиентов, каждый делает per_client запросов подряд.
+
+    request(номер клиента, номер запроса) -> ответ; ошибка — исключение или статус >= 400.
+    """
+    latencies: List[float] = []
+    errors = 0
+
+    async def client(c: int) -> None:
+        nonlocal errors
+        for i in range(per_client):
+            started = time.perf_counter()
+            try:
+                response = await request(c, i)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    return Result(latencies, errors, time.perf_counter() - started)
+
+
+# --- Сценарии ---
+
+async def scenario_scan(http: httpx.AsyncClient, fakes: httpx.AsyncClient, params: dict) -> Result:
+    """Сканеры на линиях: у каждого своя партия, каждый 10-й скан — ревизия, ещё один — инвентаризация"""
+    per_batch = params["scans"]
+    await fakes.post("/db/_bench/reset", json={"batches": params["scanners"], "boxes_per_batch": per_batch})
+
+    def request(c: int, i: int):
+        box = box_id(c * per_batch + i + 1)
+        mode = {8: "revision", 9: "inventory"}.get(i % 10, "production")
+        return http.post("/api/scan", json={
+            "box_id": box, "mode": mode, "user_name": user_name(c + 1), "machine_id": f"M{c % 10 + 1}",
+        })
+
+    return await run_clients(params["scanners"], per_batch, request)
+
+
+def scenario_print(count: int) -> Callable:
+    async def scenario(http: httpx.AsyncClient, fakes: httpx.AsyncClient, params: dict) -> Result:
+        """Печать партии: от нажатия «Печать» до скачанного PDF.
+
+        Через фоновое задание: синхронный /api/print обрывает ожидание
+        по PRINT_SYNC_TIMEOUT, и большие партии не попали бы в замер.
+        """
+        await fakes.post("/db/_bench/reset", json={})
+        body = {
+            "brand_name": "Махеевъ", "type": "Соус", "category": "Майонезный",
+            "recipe": "Провансаль 67%", "items_per_box": 12, "count": count, "background": True,
+        }
+
+        async def request(c: int, i: int) -> httpx.Response:
+            response = await http.post("/api/print", json=body)
+            if response.status_code >= 400:
+                return response
+            status_url = response.json()["status_url"]
+            while (await http.get(status_url)).json()["status"] not in ("done", "error"):
+                await asyncio.sleep(0.2)
+            # Для упавшего задания ручка PDF отвечает 500 — это и будет ошибкой
+            return await http.get(f"{status_url}/pdf")
+
+        return await run_clients(params["clients"], params["prints"], request)
+    return scenario
+
+
+async def scenario_login_storm(http: httpx.AsyncClient, fakes: httpx.AsyncClient, params: dict) -> Result:
+    """Начало смены: кэш справочников пуст, все планшеты входят одновременно"""
+    await fakes.post("/sheets/_bench/reset", json={"users": params["clients"]})
+    await http.post("/api/cache/invalidate")
+
+    def request(c: int, i: int):
+        return http.post("/api/auth/login", json={"user_id": user_name(c + 1), "pin_code": user_pin(c + 1)})
+
+    return await run_clients(params["clients"], params["logins"], request)
+
+
+SCENARIOS: Dict[str, tuple] = {
+    # имя: (функция, параметры)
+    "scan": (scenario_scan, {"scanners": 20, "scans": 250}),
+    "print_1k": (scenario_print(1000), {"clients": 1, "prints": 3}),
+    "print_5k": (scenario_print(5000), {"clients": 1, "prints": 1}),
+    "login_storm": (scenario_login_storm, {"clients": 50, "logins": 20}),
+}
+
+
+# --- Процессы приложения и заглушек ---
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"Процесс завершился с кодом {proc.returncode}: {' '.join(proc.args)}")
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} не ответил за {timeout:.0f} с")
+
+
+class Stand:
+    """Заглушки + приложение в отдельных процессах; рабочие файлы — во временной папке"""
+
+    def __init__(self, db_latency: float, sheets_latency: float):
+        self.db_latency = db_latency
+        self.sheets_latency = sheets_latency
+        self.procs: List[subprocess.Popen] = []
+        self.workdir = tempfile.TemporaryDirectory(prefix="sauce_bench_")
+
+    async def __aenter__(self) -> "Stand":
+        db_port, sheets_port, app_port = free_port(), free_port(), free_port()
+        self.db_url = f"http://127.0.0.1:{db_port}"
+        self.sheets_url = f"http://127.0.0.1:{sheets_port}"
+        self.app_url = f"http://127.0.0.1:{app_port}"
+
+        env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+        fakes = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fakes", "--db-port", str(db_port),
+             "--sheets-port", str(sheets_port), "--db-latency", str(self.db_latency),
+             "--sheets-latency", str(self.sheets_latency)],
+            cwd=BACKEND_DIR, env=env,
+        )
+        self.procs.append(fakes)
+        await wait_ready(f"{self.db_url}/_bench/stats", fakes)
+        await wait_ready(f"{self.sheets_url}/_bench/stats", fakes)
+
+        work = self.workdir.name
+        env.update({
+            "SUPABASE_URL": self.db_url,
+            "SUPABASE_KEY": "bench",
+            "GOOGLE_API_ENDPOINT": self.sheets_url + "/",
+            # Пустые значения, чтобы load_dotenv не подставил настоящие ключи из .env
+            "GOOGLE_SERVICE_ACCOUNT_JSON": "",
+            "TELEGRAM_TOKEN": "",
+            "TELEGRAM_CHAT_ID": "",
+            "GOOGLE_SHEET_ID_REPORTS": "bench-reports",
+            "OUTBOX_DB": os.path.join(work, "outbox.sqlite3"),
+            "PDF_CACHE_DIR": os.path.join(work, "pdf"),
+            "LOG_LEVEL": "WARNING",
+        })
+        # cwd — временная папка: service_account.json из backend не подхватится
+        app = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", str(app_port), "--log-level", "warning", "--no-access-log"],
+            cwd=work, env=env,
+        )
+        self.procs.append(app)
+        await wait_ready(f"{self.app_url}/api/ping", app)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        for proc in reversed(self.procs):
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        self.workdir.cleanup()
+
+
+class _FakesRouter(httpx.AsyncBaseTransport):
+    """Один клиент к служебным ручкам обеих заглушек: /db/... и /sheets/..."""
+
+    def __init__(self, stand: Stand):
+        self._stand = stand
+        self._inner = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        prefix, _, path = request.url.path.lstrip("/").partition("/")
+        base = self._stand.db_url if prefix == "db" else self._stand.sheets_url
+        request.url = httpx.URL(f"{base}/{path}")
+        return await self._inner.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+# --- Базы для сравнения ---
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(terse=True),
+        "cpus": os.cpu_count(),
+        # Сценарии печати меряют рендер: база с другой вёрсткой этикеток устарела
+        "label_render_version": LABEL_RENDER_VERSION,
+    }
+
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINES_DIR, f"{name}.json")
+
+
+def load_baseline(name: str) -> Optional[dict]:
+    try:
+        with open(baseline_path(name), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(name: str, record: dict) -> None:
+    os.makedirs(BASELINES_DIR, exist_ok=True)
+    with open(baseline_path(name), "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def incomparable(record: dict, baseline: dict) -> Optional[str]:
+    """Почему прогон нельзя сравнивать с базой (None — можно)"""
+    if baseline["params"] != record["params"]:
+        return "база снята с другими параметрами"
+    if baseline["environment"].get("cpus") != record["environment"]["cpus"]:
+        return f"база снята на {baseline['environment'].get('cpus')} CPU"
+    render_version = record["environment"]["label_render_version"]
+    if record["scenario"].startswith("print") and baseline["environment"].get("label_render_version") != render_version:
+        return "база снята с другой версией вёрстки этикеток"
+    return None
+
+
+def compare(record: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Список регрессий относительно базы (пустой — всё в пределах допуска)"""
+    problems = []
+    old, new = baseline["result"], record["result"]
+    if old["p95_ms"] and new["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+        problems.append(f"p95 {old['p95_ms']:.1f} -> {new['p95_ms']:.1f} мс")
+    if old["rps"] and new["rps"] < old["rps"] * (1 - tolerance):
+        problems.append(f"RPS {old['rps']:.1f} -> {new['rps']:.1f}")
+    if new["errors"] > old["errors"]:
+        problems.append(f"ошибок {old['errors']} -> {new['errors']}")
+    return problems
+
+
+def _change(new: float, old: float) -> str:
+    return f"{(new - old) / old * 100:+.0f}%" if old else "—"
+
+
+async def run(args) -> int:
+    names = args.scenarios or list(SCENARIOS)
+    failed = False
+    print(f"{'сценарий':<12} {'запросов':>8} {'ошибок':>7} {'RPS':>9} {'p50, мс':>9} "
+          f"{'p95, мс':>9} {'p99, мс':>9}  к базе")
+
+    async with Stand(args.db_latency, args.sheets_latency) as stand:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=stand.app_url, timeout=300, limits=limits) as http, \
+                httpx.AsyncClient(base_url="http://fakes", transport=_FakesRouter(stand)) as fakes:
+            for name in names:
+                scenario, params = SCENARIOS[name]
+                result = await scenario(http, fakes, params)
+                record = {
+                    "scenario": name,
+                    "params": {**params, "db_latency_ms": args.db_latency, "sheets_latency_ms": args.sheets_latency},
+                    "result": result.summary(),
+                    "environment": environment(),
+                    "recorded_at": date.today().isoformat(),
+                }
+                s = record["result"]
+
+                note = ""
+                baseline = load_baseline(name)
+                if args.save_baseline:
+                    save_baseline(name, record)
+                    note = "база сохранена"
+                elif baseline is None:
+                    note = "базы нет"
+                elif (reason := incomparable(record, baseline)) is not None:
+                    note = reason
+                else:
+                    problems = compare(record, baseline, args.tolerance)
+                    b = baseline["result"]
+                    note = f"RPS {_change(s['rps'], b['rps'])}, p95 {_change(s['p95_ms'], b['p95_ms'])}"
+                    if problems:
+                        failed = True
+                        note += "  РЕГРЕССИЯ: " + "; ".join(problems)
+
+                print(f"{name:<12} {s['requests']:>8} {s['errors']:>7} {s['rps']:>9.2f} {s['p50_ms']:>9.1f} "
+                      f"{s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f}  {note}")
+
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочные сценарии API на локальных заглушках")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help="какие сценарии запускать (по умолчанию все): " + ", ".join(SCENARIOS))
+    parser.add_argument("--db-latency", type=float, default=DB_LATENCY_MS, help="задержка БД, мс")
+    parser.add_argument("--sheets-latency", type=float, default=SHEETS_LATENCY_MS, help="задержка Sheets, мс")
+    parser.add_argument("--save-baseline", action="store_true", help="записать результаты как новую базу")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="допустимое ухудшение p95 и RPS относительно базы (доля)")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(unknown)}")
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
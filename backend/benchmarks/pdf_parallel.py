@@ -0,0 +1,66 @@
+# Сравнение однопроцессного и параллельного рендера этикеток.
+#
+# Запуск из папки backend:
+#   python -m benchmarks.pdf_parallel --counts 1000 5000 --workers 4
+#
+# Для каждого размера печатает время рендера в одном процессе и в пуле
+# из --workers процессов, а также ускорение. Выигрыш есть, только если
+# у машины действительно несколько ядер.
+import argparse
+import random
+import time
+import uuid
+
+from app.services import pdf
+
+LABEL_INFO = {
+    "type": "Соус",
+    "category": "Майонезный",
+    "recipe": "Провансаль 67%",
+    "brand": "Махеевъ",
+    "items_per_box": 12,
+    "date": "18.10.26",
+    "time": "09:30",
+}
+
+
+def make_boxes(count: int) -> list:
+    # Фиксированные id, чтобы запуски были сравнимы между собой. Случайные
+    # с постоянным зерном, а не 1, 2, 3...: QR из почти одних нулей короче
+    # настоящего uuid4 и рисуется быстрее, чем на реальной партии
+    rng = random.Random(0)
+    return [{"id": str(uuid.UUID(int=rng.getrandbits(128), version=4))} for _ in range(count)]
+
+
+def render(boxes: list, workers: int) -> tuple:
+    started = time.perf_counter()
+    size = sum(len(part) for part in pdf.iter_labels_pdf(boxes, LABEL_INFO, workers=workers))
+    return time.perf_counter() - started, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк параллельного рендера этикеток")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--workers", type=int, default=pdf.PDF_WORKERS)
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Прогрев: запуск процессов пула не должен попадать в замер
+        render(make_boxes(args.workers * pdf.PDF_CHUNK_SIZE), args.workers)
+
+    parallel_title = f"{args.workers} проц., с"
+    print(f"{'этикеток':>9} {'1 процесс, с':>13} {parallel_title:>13} {'ускорение':>10} {'размер, КБ':>11}")
+    for count in args.counts:
+        boxes = make_boxes(count)
+        t_single, size = render(boxes, 1)
+        t_parallel, _ = render(boxes, args.workers)
+        print(
+            f"{count:>9} {t_single:>13.2f} {t_parallel:>13.2f} "
+            f"{t_single / t_parallel:>9.2f}x {size / 1024:>11.0f}"
+        )
+
+    pdf.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+-- Атомарное сканирование коробки в режиме фасовки (вызывается из /api/scan).
+--
+-- Раньше API делал 4 запроса: коробка -> план партии -> count(*) -> update,
+-- и два сканера могли одновременно пройти проверку плана или дубля.
+-- Здесь всё происходит в одной транзакции: коробка и партия блокируются
+-- FOR UPDATE, поэтому параллельные сканы одной партии идут по очереди.
+--
+-- Возвращает {"result": "ok" | "duplicate" | "unknown" | "plan_exceeded"}.
+
+create or replace function public.scan_box_production(
+    p_box_id     public.boxes.id%type,
+    p_scanned_at public.boxes.scanned_at%type,
+    p_user_name  public.boxes.scanned_by_user_name%type default null,
+    p_machine_id public.boxes.produced_on_machine_id%type default null,
+    p_coworkers  public.boxes.coworkers%type default null
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_box      public.boxes%rowtype;
+    v_planned  integer;
+    v_produced integer;
+begin
+    select * into v_box from public.boxes where id = p_box_id for update;
+    if not found then
+        return jsonb_build_object('result', 'unknown');
+    end if;
+
+    if v_box.status = 'PRODUCED' then
+        return jsonb_build_object('result', 'duplicate');
+    end if;
+
+    if v_box.batch_id is not null then
+        -- Блокировка строки партии сериализует проверку плана
+        select planned_quantity into v_planned
+          from public.batches where id = v_box.batch_id for update;
+
+        select count(*) into v_produced
+          from public.boxes
+         where batch_id = v_box.batch_id and status = 'PRODUCED';
+
+        if v_produced >= coalesce(v_planned, 0) then
+            return jsonb_build_object('result', 'plan_exceeded');
+        end if;
+    end if;
+
+    update public.boxes
+       set status = 'PRODUCED',
+           scanned_at = coalesce(p_scanned_at, now()),
+           scanned_by_user_name = p_user_name,
+           produced_on_machine_id = p_machine_id,
+           coworkers = p_coworkers
+     where id = p_box_id;
+
+    return jsonb_build_object('result', 'ok');
+end;
+$$;
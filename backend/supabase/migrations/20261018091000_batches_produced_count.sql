@@ -0,0 +1,96 @@
+-- Счётчик выпущенных коробок в партии.
+--
+-- Проверка плана делала count(*) по всем коробкам партии на каждом скане,
+-- то есть O(размер партии). Теперь batches.produced_count поддерживается
+-- триггером на boxes, а scan_box_production читает его из уже
+-- заблокированной строки партии. Счётчик же удобно показывать как прогресс.
+
+alter table public.batches
+    add column if not exists produced_count integer not null default 0;
+
+update public.batches b
+   set produced_count = (
+       select count(*) from public.boxes x
+        where x.batch_id = b.id and x.status = 'PRODUCED'
+   );
+
+create or replace function public.boxes_track_produced()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op = 'UPDATE'
+       and old.status is not distinct from new.status
+       and old.batch_id is not distinct from new.batch_id then
+        return null;
+    end if;
+
+    if tg_op in ('UPDATE', 'DELETE')
+       and old.status = 'PRODUCED' and old.batch_id is not null then
+        update public.batches
+           set produced_count = produced_count - 1
+         where id = old.batch_id;
+    end if;
+
+    if tg_op in ('INSERT', 'UPDATE')
+       and new.status = 'PRODUCED' and new.batch_id is not null then
+        update public.batches
+           set produced_count = produced_count + 1
+         where id = new.batch_id;
+    end if;
+
+    return null;
+end;
+$$;
+
+drop trigger if exists boxes_track_produced on public.boxes;
+create trigger boxes_track_produced
+    after insert or delete or update of status, batch_id on public.boxes
+    for each row execute function public.boxes_track_produced();
+
+-- Та же логика, что в 20261018090000, но без count(*)
+create or replace function public.scan_box_production(
+    p_box_id     public.boxes.id%type,
+    p_scanned_at public.boxes.scanned_at%type,
+    p_user_name  public.boxes.scanned_by_user_name%type default null,
+    p_machine_id public.boxes.produced_on_machine_id%type default null,
+    p_coworkers  public.boxes.coworkers%type default null
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_box      public.boxes%rowtype;
+    v_planned  integer;
+    v_produced integer;
+begin
+    select * into v_box from public.boxes where id = p_box_id for update;
+    if not found then
+        return jsonb_build_object('result', 'unknown');
+    end if;
+
+    if v_box.status = 'PRODUCED' then
+        return jsonb_build_object('result', 'duplicate');
+    end if;
+
+    if v_box.batch_id is not null then
+        -- Блокировка строки партии сериализует проверку плана
+        select planned_quantity, produced_count into v_planned, v_produced
+          from public.batches where id = v_box.batch_id for update;
+
+        if coalesce(v_produced, 0) >= coalesce(v_planned, 0) then
+            return jsonb_build_object('result', 'plan_exceeded');
+        end if;
+    end if;
+
+    -- produced_count увеличит триггер boxes_track_produced
+    update public.boxes
+       set status = 'PRODUCED',
+           scanned_at = coalesce(p_scanned_at, now()),
+           scanned_by_user_name = p_user_name,
+           produced_on_machine_id = p_machine_id,
+           coworkers = p_coworkers
+     where id = p_box_id;
+
+    return jsonb_build_object('result', 'ok');
+end;
+$$;
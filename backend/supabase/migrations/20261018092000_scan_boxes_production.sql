@@ -0,0 +1,52 @@
+-- Пакетная фасовка для очереди офлайн-сканов (/api/scan/batch).
+--
+-- p_items — массив объектов в форме строки boxes:
+--   [{"id": ..., "scanned_at": ..., "scanned_by_user_name": ...,
+--     "produced_on_machine_id": ..., "coworkers": [...]}, ...]
+-- Элементы обрабатываются по порядку той же scan_box_production, поэтому
+-- результат совпадает с последовательными одиночными сканами.
+-- Возвращает массив {"result": ...} в том же порядке.
+--
+-- Сначала блокируем все коробки, затем все партии (по возрастанию id):
+-- одиночный скан берёт блокировки в том же порядке (коробка -> партия),
+-- так что взаимных блокировок с ним и с другими пакетами не возникает.
+
+create or replace function public.scan_boxes_production(p_items jsonb)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_item    record;
+    v_results jsonb := '[]'::jsonb;
+begin
+    perform 1 from public.boxes
+     where id in (select i.id from jsonb_populate_recordset(null::public.boxes, p_items) i)
+     order by id
+       for update;
+
+    perform 1 from public.batches
+     where id in (
+         select b.batch_id from public.boxes b
+          where b.id in (select i.id from jsonb_populate_recordset(null::public.boxes, p_items) i)
+     )
+     order by id
+       for update;
+
+    for v_item in
+        select * from jsonb_populate_recordset(null::public.boxes, p_items) with ordinality as i
+         order by i.ordinality
+    loop
+        v_results := v_results || jsonb_build_array(
+            public.scan_box_production(
+                v_item.id,
+                v_item.scanned_at,
+                v_item.scanned_by_user_name,
+                v_item.produced_on_machine_id,
+                v_item.coworkers
+            )
+        );
+    end loop;
+
+    return v_results;
+end;
+$$;
@@ -0,0 +1,14 @@
+-- Данные для повторной генерации этикеток партии (/api/print/{id}.pdf).
+--
+-- batches.label_info — то, что печатается на этикетке (бренд, тип, категория,
+-- рецептура, шт/кор., дата и время печати). boxes.box_no — номер коробки
+-- на этикетке, чтобы порядок при перепечатке совпадал с исходным.
+
+alter table public.batches
+    add column if not exists label_info jsonb;
+
+alter table public.boxes
+    add column if not exists box_no integer;
+
+create index if not exists boxes_batch_id_box_no_idx
+    on public.boxes (batch_id, box_no);
@@ -0,0 +1,21 @@
+-- Создание коробок партии на стороне БД (/api/print при BOX_IDS_SERVER_SIDE=1).
+--
+-- Вместо того чтобы гонять тысячи UUID из приложения в запросе вставки,
+-- БД сама генерирует id и возвращает их одним массивом в порядке box_no.
+-- Возвращаем jsonb, а не таблицу: на результат RPC-таблиц действует
+-- лимит строк PostgREST (db-max-rows), на одно jsonb-значение — нет.
+
+create or replace function public.create_batch_boxes(
+    p_batch_id public.batches.id%type,
+    p_count    integer
+) returns jsonb
+language sql
+as $$
+    with inserted as (
+        insert into public.boxes (id, batch_id, status, box_no)
+        select gen_random_uuid(), p_batch_id, 'CREATED', g
+          from generate_series(1, p_count) as g
+        returning id, box_no
+    )
+    select coalesce(jsonb_agg(id order by box_no), '[]'::jsonb) from inserted;
+$$;
@@ -0,0 +1,22 @@
+-- Сессии инвентаризации: итоги считает сервер, а не планшет.
+--
+-- inventory_sessions — одна инвентаризация (кто, когда начал и закончил).
+-- inventory_scans — коробки, отсканированные в сессии; первичный ключ
+-- (session_id, box_id) не даёт посчитать одну коробку дважды.
+-- product — название продукта на момент скана (batches.product_info),
+-- по нему собираются итоги без повторного обхода коробок и партий.
+
+create table if not exists public.inventory_sessions (
+    id          uuid primary key default gen_random_uuid(),
+    user_name   text,
+    started_at  timestamptz not null default now(),
+    finished_at timestamptz
+);
+
+create table if not exists public.inventory_scans (
+    session_id uuid not null references public.inventory_sessions (id) on delete cascade,
+    box_id     uuid not null,
+    product    text,
+    scanned_at timestamptz not null default now(),
+    primary key (session_id, box_id)
+);
@@ -0,0 +1,94 @@
+-- batches.produced_count: коробки, которые хоть раз вышли из CREATED.
+--
+-- Триггер из 20261018091000 считал только текущий статус PRODUCED, и после
+-- инвентаризации (PRODUCED -> INVENTORY_OK) прогресс партии уменьшался.
+-- Теперь коробка остаётся в счётчике при любом статусе после CREATED;
+-- уходит из него только при удалении, возврате в CREATED или смене партии.
+
+create or replace function public.boxes_track_produced()
+returns trigger
+language plpgsql
+as $$
+declare
+    v_old boolean := tg_op in ('UPDATE', 'DELETE')
+                     and old.batch_id is not null
+                     and coalesce(old.status, 'CREATED') <> 'CREATED';
+    v_new boolean := tg_op in ('INSERT', 'UPDATE')
+                     and new.batch_id is not null
+                     and coalesce(new.status, 'CREATED') <> 'CREATED';
+begin
+    if tg_op = 'UPDATE'
+       and v_old = v_new
+       and old.batch_id is not distinct from new.batch_id then
+        return null;
+    end if;
+
+    if v_old then
+        update public.batches
+           set produced_count = produced_count - 1
+         where id = old.batch_id;
+    end if;
+
+    if v_new then
+        update public.batches
+           set produced_count = produced_count + 1
+         where id = new.batch_id;
+    end if;
+
+    return null;
+end;
+$$;
+
+update public.batches b
+   set produced_count = (
+       select count(*) from public.boxes x
+        where x.batch_id = b.id and coalesce(x.status, 'CREATED') <> 'CREATED'
+   );
+
+-- Повторная фасовка коробки после инвентаризации счётчик не меняет,
+-- поэтому план для неё не проверяем
+create or replace function public.scan_box_production(
+    p_box_id     public.boxes.id%type,
+    p_scanned_at public.boxes.scanned_at%type,
+    p_user_name  public.boxes.scanned_by_user_name%type default null,
+    p_machine_id public.boxes.produced_on_machine_id%type default null,
+    p_coworkers  public.boxes.coworkers%type default null
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_box      public.boxes%rowtype;
+    v_planned  integer;
+    v_produced integer;
+begin
+    select * into v_box from public.boxes where id = p_box_id for update;
+    if not found then
+        return jsonb_build_object('result', 'unknown');
+    end if;
+
+    if v_box.status = 'PRODUCED' then
+        return jsonb_build_object('result', 'duplicate');
+    end if;
+
+    if v_box.batch_id is not null and coalesce(v_box.status, 'CREATED') = 'CREATED' then
+        -- Блокировка строки партии сериализует проверку плана
+        select planned_quantity, produced_count into v_planned, v_produced
+          from public.batches where id = v_box.batch_id for update;
+
+        if coalesce(v_produced, 0) >= coalesce(v_planned, 0) then
+            return jsonb_build_object('result', 'plan_exceeded');
+        end if;
+    end if;
+
+    -- produced_count увеличит триггер boxes_track_produced
+    update public.boxes
+       set status = 'PRODUCED',
+           scanned_at = coalesce(p_scanned_at, now()),
+           scanned_by_user_name = p_user_name,
+           produced_on_machine_id = p_machine_id,
+           coworkers = p_coworkers
+     where id = p_box_id;
+
+    return jsonb_build_object('result', 'ok');
+end;
+$$;
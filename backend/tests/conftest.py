@@ -0,0 +1,25 @@
+# Общие фикстуры: Supabase подменяется заглушкой PostgREST из benchmarks.fakes.
+import httpx
+import pytest
+from supabase import AsyncClientOptions, acreate_client
+
+from app.routers import scan
+from app.services.batch_cache import batch_cache
+from benchmarks.fakes import postgrest
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Таблицы заглушки: одна партия из 5 коробок, box_id(1) ... box_id(5)"""
+    store = postgrest.Store()
+    app = postgrest.create_app(store)
+    store.reset(batches=1, boxes_per_batch=5)
+    batch_cache.invalidate()
+
+    async def fake_db():
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake")
+        return await acreate_client("http://fake", "key", AsyncClientOptions(httpx_client=http))
+
+    monkeypatch.setattr(scan, "get_async_supabase", fake_db)
+    store.connect = fake_db
+    return store
@@ -0,0 +1,23 @@
+# Фоновое обновление справочников из Google Sheets.
+import threading
+
+from app.services.google_sheets import GoogleSheetsService
+
+
+def test_refreshes_share_one_thread():
+    # Клиент Sheets собирается на поток, поэтому обновления не должны плодить потоки
+    sheets = GoogleSheetsService(cache_ttl=0)
+    threads = []
+
+    def loader():
+        threads.append(threading.get_ident())
+        return ["строка"]
+
+    sheets._cached("users", loader)
+    for _ in range(3):
+        sheets._cached("users", loader)
+        sheets._refresher.submit(lambda: None).result()
+
+    assert len(threads) == 4
+    assert len(set(threads[1:])) == 1
+    assert threads[0] not in threads[1:]
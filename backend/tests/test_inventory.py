@@ -0,0 +1,28 @@
+# Итоги инвентаризации при нескольких воркерах.
+import asyncio
+
+from app.routers import scan
+from app.services.inventory import InventorySessions, inventory_sessions
+from app.services.scan_repo import ScanRepository
+from benchmarks.fakes import postgrest
+
+
+def test_finish_counts_scans_from_other_workers(store, monkeypatch):
+    monkeypatch.setattr(scan, "notify", lambda *args, **kwargs: None)
+
+    async def run():
+        repo = ScanRepository(await store.connect())
+        session = await inventory_sessions.start(repo, "Оператор 1")
+        # Этот воркер принял одну коробку, второй (своя память) — ещё две
+        await inventory_sessions.record(repo, session, [{"box_id": postgrest.box_id(1), "product": "Соус"}])
+        other = InventorySessions()
+        other_session = await other.get(repo, session.id)
+        await other.record(repo, other_session, [
+            {"box_id": postgrest.box_id(2), "product": "Соус"},
+            {"box_id": postgrest.box_id(3), "product": None},
+        ])
+        return await scan.api_finish_inventory({"session_id": session.id})
+
+    result = asyncio.run(run())
+
+    assert result["stats"] == {"Соус": 2, "Неизвестный продукт": 1}
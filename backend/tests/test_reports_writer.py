@@ -0,0 +1,99 @@
+# Строки отчёта от нескольких воркеров: общий файл outbox, каждая строка — один раз.
+import os
+
+import pytest
+
+from app.services import sheets_writer
+from app.services.outbox import Outbox
+from app.services.sheets_writer import HEADERS, REPORT_ROW, ReportsWriter
+from benchmarks.fakes.sheets import Workbook, _sheet_title
+
+
+class _Call:
+    def __init__(self, func):
+        self.func = func
+
+    def execute(self):
+        return self.func()
+
+
+class WorkbookService:
+    """Клиент Sheets API поверх Workbook из заглушки; fail — листы, запись в которые падает"""
+
+    def __init__(self, workbook: Workbook):
+        self.workbook = workbook
+        self.fail = set()
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, **kwargs):
+        return _Call(lambda: {"sheets": self.workbook.properties()})
+
+    def batchUpdate(self, spreadsheetId, body):
+        return _Call(lambda: self.workbook.batch_update(body["requests"]))
+
+    def append(self, spreadsheetId, range, body, **kwargs):
+        def call():
+            if _sheet_title(range) in self.fail:
+                raise ConnectionError("Google недоступен")
+            return self.workbook.append(range, body["values"])
+        return _Call(call)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    workbook = Workbook()
+    workbook.reset()
+    service = WorkbookService(workbook)
+    monkeypatch.setattr(sheets_writer, "get_service", lambda: service)
+    return service
+
+
+def workers(tmp_path, count=2):
+    """Воркеры приложения: у каждого свой Outbox и ReportsWriter, файл БД общий"""
+    path = os.path.join(tmp_path, "outbox.sqlite3")
+    queues = [Outbox(path) for _ in range(count)]
+    return queues, [ReportsWriter("sheet", queue=queue, interval=0) for queue in queues]
+
+
+def test_two_writers_share_one_outbox(tmp_path, service):
+    (queue_a, queue_b), (writer_a, writer_b) = workers(tmp_path)
+    writer_a.add({"brand": "A1"})
+    writer_b.add({"brand": "B1"})
+    writer_a.add({"brand": "A2"})
+
+    # Оба воркера разбирают очередь, пока она не опустеет
+    while queue_a.dispatch_due() + queue_b.dispatch_due():
+        pass
+
+    tabs = [rows for title, rows in service.workbook.sheets.items() if title not in ("users", "machines", "brands")]
+    assert len(tabs) == 1
+    assert tabs[0][0] == HEADERS
+    assert sorted(row[1] for row in tabs[0][1:]) == ["A1", "A2", "B1"]
+    assert queue_a.stats() == {"pending": 0, "dead": 0}
+
+
+def test_failed_tab_does_not_resend_written_tabs(tmp_path, service):
+    (queue,), (writer,) = workers(tmp_path, count=1)
+    queue.enqueue(REPORT_ROW, {"sheet": "17.10.2026", "row": ["", "вчера"]})
+    queue.enqueue(REPORT_ROW, {"sheet": "18.10.2026", "row": ["", "сегодня"]})
+    service.fail.add("18.10.2026")
+
+    while queue.dispatch_due():
+        pass
+    assert service.workbook.sheets["17.10.2026"] == [HEADERS, ["", "вчера"]]
+    assert service.workbook.sheets["18.10.2026"] == [HEADERS]
+    assert queue.stats()["pending"] == 1
+
+    # Google снова доступен, а пауза после сбоя истекла
+    service.fail.clear()
+    queue._paused_until.clear()
+    queue._conn().execute("UPDATE outbox SET available_at = 0")
+    while queue.dispatch_due():
+        pass
+    assert service.workbook.sheets["17.10.2026"] == [HEADERS, ["", "вчера"]]
+    assert service.workbook.sheets["18.10.2026"] == [HEADERS, ["", "сегодня"]]
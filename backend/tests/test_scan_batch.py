@@ -0,0 +1,77 @@
+# Пакетный скан (/api/scan/batch) против заглушки PostgREST из benchmarks.fakes.
+import asyncio
+
+from app.models import ScanBatchRequest
+from app.routers import scan
+from app.services.inventory import inventory_sessions
+from app.services.scan_repo import ScanRepository
+from benchmarks.fakes import postgrest
+
+
+def scan_batch(*scans):
+    req = ScanBatchRequest(scans=[{"box_id": box, "mode": mode, "user_name": "Оператор 1"} for mode, box in scans])
+    return asyncio.run(scan.api_scan_batch(req))["results"]
+
+
+def test_mixed_modes_same_box_in_input_order(store):
+    box = postgrest.box_id(1)
+    results = scan_batch(
+        ("inventory", box),
+        ("production", box),
+        ("revision", box),
+        ("production", box),
+    )
+
+    assert [r["result"] for r in results] == ["ok", "ok", "ok", "duplicate"]
+    # Ревизия видит коробку после фасовки, а не снимок до пакета
+    assert results[2]["box"]["status"] == "PRODUCED"
+    # Инвентаризация прошла раньше фасовки и не затёрла PRODUCED
+    assert store.tables["boxes"][box]["status"] == "PRODUCED"
+    assert store.tables["batches"][str(store.tables["boxes"][box]["batch_id"])]["produced_count"] == 1
+
+
+def test_inventory_after_production_wins(store):
+    box = postgrest.box_id(2)
+    results = scan_batch(("production", box), ("inventory", box), ("revision", box))
+
+    assert [r["result"] for r in results] == ["ok", "ok", "ok"]
+    assert results[2]["box"]["status"] == "INVENTORY_OK"
+    assert store.tables["boxes"][box]["status"] == "INVENTORY_OK"
+
+
+def test_uppercase_box_id_is_found(store):
+    box = postgrest.box_id(3)
+    results = scan_batch(("production", box.upper()))
+
+    assert results[0]["result"] == "ok"
+    assert results[0]["box_id"] == box.upper()
+    assert store.tables["boxes"][box]["status"] == "PRODUCED"
+
+
+def test_inventory_session_fields_match_single_scan(store):
+    async def run():
+        repo = ScanRepository(await store.connect())
+        session = await inventory_sessions.start(repo, "Оператор 1")
+        await inventory_sessions.record(repo, session, [{"box_id": postgrest.box_id(1), "product": None}])
+        req = ScanBatchRequest(scans=[
+            {"box_id": box, "mode": "inventory", "user_name": "Оператор 1", "session_id": session.id}
+            for box in (postgrest.box_id(2), postgrest.box_id(1), postgrest.box_id(2), postgrest.box_id(3))
+        ])
+        return (await scan.api_scan_batch(req))["results"]
+
+    results = asyncio.run(run())
+
+    assert [r["duplicate"] for r in results] == [False, True, True, False]
+    assert [r["session_total"] for r in results] == [2, 2, 2, 3]
+
+
+def test_inventory_keeps_produced_count(store):
+    box = postgrest.box_id(4)
+    batch = store.tables["batches"][str(store.tables["boxes"][box]["batch_id"])]
+    batch["planned_quantity"] = 1
+
+    results = scan_batch(("production", box), ("inventory", box), ("production", box))
+
+    # Прогресс не уменьшается после инвентаризации, а повторная фасовка не упирается в план
+    assert [r["result"] for r in results] == ["ok", "ok", "ok"]
+    assert batch["produced_count"] == 1